@@ -0,0 +1,357 @@
+"""
+Benchmark suite for radial_build_tools. Times plotting, OpenMC model building
+and export, ParaStell slice extraction and yml I/O on synthetic builds, and
+stores the results as JSON so runs on different commits can be compared.
+OpenMC benchmarks are skipped if openmc can not be imported; no cross
+sections are needed.
+
+The run fails if the plotting command line interface takes longer than
+--startup-budget seconds to start and plot from a fresh interpreter, or if
+plotting imports openmc.
+
+usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --quick --compare results.json
+    python benchmarks/run_benchmarks.py --startup-only --startup-budget 2
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import radial_build_tools as rbt
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLE_YML = os.path.join(REPO_DIR, "ExampleRadialBuild.yml")
+# seconds allowed for the plotting command line interface to start and plot
+# ExampleRadialBuild.yml from a fresh interpreter
+DEFAULT_STARTUP_BUDGET = 5.0
+
+LAYER_COUNTS = (5, 50, 500)
+GRID_SIZES = (10, 100, 1000)
+QUICK_LAYER_COUNTS = (5, 50)
+QUICK_GRID_SIZES = (10, 100)
+PARASTELL_LAYERS = 14
+
+
+def make_build(num_layers, with_materials=False):
+    """Synthetic radial build with alternating symmetric/asymmetric layers"""
+    build = {}
+    for i in range(num_layers):
+        layer = {
+            "thickness": 1.0 + (i % 7) if i % 3 else [2.0, 3.0 + i % 5],
+            "composition": {"SS316L": 0.6, "HeT410P80": 0.4},
+            "description": f"synthetic layer {i}",
+        }
+        if with_materials:
+            layer["material_name"] = "steel"
+            if i % 4 == 0:
+                layer["scores"] = ["flux", "heating"]
+        build[f"layer_{i}"] = layer
+    return build
+
+
+def make_parastell_build(grid_size, num_layers=PARASTELL_LAYERS):
+    """Synthetic ParaStell build on a grid_size x grid_size angle grid"""
+    phi_list = np.linspace(0, 90, grid_size)
+    theta_list = np.linspace(0, 360, grid_size)
+    phi, theta = np.meshgrid(phi_list, theta_list, indexing="ij")
+    shape = 1 + 0.2 * np.sin(np.radians(theta)) * np.cos(np.radians(4 * phi))
+    radial_build = {
+        f"layer_{i}": {"thickness_matrix": shape * (i + 2), "h5m_tag": "tag"}
+        for i in range(num_layers)
+    }
+    return {
+        "phi_list": phi_list,
+        "theta_list": theta_list,
+        "radial_build": radial_build,
+    }
+
+
+def best_time(function, repeat):
+    """Best wall time of repeat calls to function"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_plot(num_layers, repeat):
+    build = make_build(num_layers)
+
+    def plot():
+        rbp = rbt.RadialBuildPlot(build, title="bench plot")
+        rbp.plot_radial_build()
+        rbp.to_png("bench_plot")
+        plt.close(rbp.figure)
+
+    return best_time(plot, repeat)
+
+
+def bench_yaml(num_layers, repeat):
+    build = make_build(num_layers)
+    rbp = rbt.RadialBuildPlot(build, title="bench yaml")
+    # write_yml expects a plotted figure
+    rbp.plot_radial_build()
+    plt.close(rbp.figure)
+    write_time = best_time(rbp.write_yml, repeat)
+    read_time = best_time(lambda: rbt.read_yaml("benchyaml.yml"), repeat)
+    return write_time, read_time
+
+
+def bench_model(num_layers, repeat):
+    import openmc
+
+    material = openmc.Material(name="steel")
+    material.add_element("Fe", 1.0)
+    material.set_density("g/cm3", 7.8)
+    materials = openmc.Materials([material])
+    build = make_build(num_layers, with_materials=True)
+
+    def get_model():
+        toroidal_model = rbt.ToroidalModel(build, 800, 200, 250, materials)
+        return toroidal_model.get_openmc_model()[0]
+
+    build_time = best_time(get_model, repeat)
+    model = get_model()
+    export_time = best_time(
+        lambda: model.export_to_model_xml("bench_model.xml"), repeat
+    )
+    return build_time, export_time
+
+
+def bench_parastell(grid_size, repeat):
+    parastell_build = make_parastell_build(grid_size)
+    phi = parastell_build["phi_list"][grid_size // 2]
+    theta = parastell_build["theta_list"][grid_size // 3]
+    return best_time(
+        lambda: rbt.RadialBuildPlot.from_parastell_build(
+            parastell_build, phi, theta
+        ),
+        repeat,
+    )
+
+
+def bench_cold_start(repeat):
+    """
+    Time the plotting command line interface from a fresh interpreter, and
+    check that plotting does not import openmc.
+
+    Returns:
+        cli_time (float): best wall time to plot ExampleRadialBuild.yml
+        import_time (float): best wall time to import radial_build_tools
+        imports_openmc (bool): whether importing and plotting loaded openmc
+    """
+    script = os.path.join(REPO_DIR, "radial_build_tools.py")
+
+    def plot():
+        # a fresh output directory each run, so the png is rendered rather
+        # than skipped as up to date
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run(
+                [
+                    sys.executable,
+                    script,
+                    EXAMPLE_YML,
+                    "--force",
+                    "--output-dir",
+                    directory,
+                ],
+                check=True,
+            )
+
+    cli_time = best_time(plot, repeat)
+    import_time = best_time(
+        lambda: subprocess.run(
+            [sys.executable, "-c", "import radial_build_tools"],
+            cwd=REPO_DIR,
+            check=True,
+        ),
+        repeat,
+    )
+    check = (
+        "import sys, radial_build_tools as rbt\n"
+        f"rbt.RadialBuildPlot(rbt.read_yaml({EXAMPLE_YML!r})['build'])"
+        ".plot_radial_build()\n"
+        "sys.exit('openmc' in sys.modules)"
+    )
+    imports_openmc = (
+        subprocess.run([sys.executable, "-c", check], cwd=REPO_DIR).returncode
+        != 0
+    )
+    return cli_time, import_time, imports_openmc
+
+
+def run(quick, repeat):
+    """Run every benchmark, returning a list of result dicts"""
+    layer_counts = QUICK_LAYER_COUNTS if quick else LAYER_COUNTS
+    grid_sizes = QUICK_GRID_SIZES if quick else GRID_SIZES
+    results = []
+
+    def record(name, params, seconds):
+        results.append({"name": name, "params": params, "seconds": seconds})
+        print(f"{name:<24} {json.dumps(params):<24} {seconds:10.5f} s")
+
+    cli_time, import_time, imports_openmc = bench_cold_start(repeat)
+    record("cli_cold_start", {}, cli_time)
+    record("import", {}, import_time)
+    results[-2]["imports_openmc"] = imports_openmc
+
+    for num_layers in layer_counts:
+        params = {"layers": num_layers}
+        record("plot_radial_build+to_png", params, bench_plot(num_layers, repeat))
+        write_time, read_time = bench_yaml(num_layers, repeat)
+        record("write_yml", params, write_time)
+        record("read_yaml", params, read_time)
+
+    try:
+        import openmc  # noqa: F401
+    except ImportError:
+        print("openmc not importable, skipping model benchmarks")
+    else:
+        for num_layers in layer_counts:
+            params = {"layers": num_layers}
+            build_time, export_time = bench_model(num_layers, repeat)
+            record("get_openmc_model", params, build_time)
+            record("export_to_model_xml", params, export_time)
+
+    for grid_size in grid_sizes:
+        params = {"grid": f"{grid_size}x{grid_size}"}
+        record("from_parastell_build", params, bench_parastell(grid_size, repeat))
+
+    return results
+
+
+def git_commit():
+    """Commit of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """Print the ratio of each result to the same benchmark in a baseline"""
+    with open(baseline_file) as file:
+        baseline = json.load(file)
+    baseline_times = {
+        (result["name"], json.dumps(result["params"])): result["seconds"]
+        for result in baseline["results"]
+    }
+    print(f"\ncompared to {baseline_file} ({baseline.get('commit')}):")
+    for result in results:
+        key = (result["name"], json.dumps(result["params"]))
+        if key in baseline_times:
+            ratio = result["seconds"] / baseline_times[key]
+            print(f"{key[0]:<24} {key[1]:<24} {ratio:6.2f}x")
+
+
+def check_startup(cli_time, imports_openmc, budget):
+    """
+    Check the cold start of the plotting command line interface.
+
+    Returns:
+        status (int): 0 if within budget and openmc was not imported, else 1
+    """
+    status = 0
+    if cli_time > budget:
+        print(
+            f"FAIL: plotting CLI cold start took {cli_time:.2f} s, budget is "
+            f"{budget:.2f} s"
+        )
+        status = 1
+    if imports_openmc:
+        print("FAIL: plotting imported openmc")
+        status = 1
+    if status == 0:
+        print(f"plotting CLI cold start {cli_time:.2f} s within {budget:.2f} s")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="run_benchmarks")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument("--compare", help="JSON results file to compare to")
+    parser.add_argument(
+        "--quick", action="store_true", help="skip the largest builds"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=DEFAULT_STARTUP_BUDGET,
+        help="fail if the plotting command line interface takes longer than "
+        "this many seconds, or imports openmc",
+    )
+    parser.add_argument(
+        "--startup-only",
+        action="store_true",
+        help="only run the command line interface cold start check",
+    )
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    if args.startup_only:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                cli_time, _, imports_openmc = bench_cold_start(args.repeat)
+            finally:
+                os.chdir(cwd)
+        sys.exit(check_startup(cli_time, imports_openmc, args.startup_budget))
+
+    output = None if args.output is None else os.path.abspath(args.output)
+    baseline = None if args.compare is None else os.path.abspath(args.compare)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results = run(args.quick, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    data = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(data, file, indent=2)
+    if baseline is not None:
+        compare(results, baseline)
+
+    cold_start = results[0]
+    sys.exit(
+        check_startup(
+            cold_start["seconds"],
+            cold_start["imports_openmc"],
+            args.startup_budget,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the per_layer and grouped tally layouts of ToroidalModel.build_tallies
+on a synthetic build where every layer requests several scores.
+
+usage: python benchmarks/tally_layout.py --layers 50 --scores 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import openmc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from radial_build_tools import ToroidalModel
+
+SCORES = ["flux", "heating", "H3-production", "damage-energy", "(n,gamma)"]
+
+
+def make_build(num_layers, num_scores):
+    """Synthetic build, alternating between two score sets"""
+    material = openmc.Material(name="steel")
+    material.add_element("Fe", 1.0)
+    material.set_density("g/cm3", 7.8)
+    build = {}
+    for i in range(num_layers):
+        scores = SCORES[: num_scores - (i % 2)] or SCORES[:1]
+        build[f"layer_{i}"] = {
+            "thickness": 2.0,
+            "material_name": "steel",
+            "scores": scores,
+        }
+    return build, openmc.Materials([material])
+
+
+def time_layout(build, materials, tally_mode, repeat):
+    """Time building and exporting the tallies of one layout"""
+    toroidal_model = ToroidalModel(
+        build, 500, 150, 200, materials, tally_mode=tally_mode
+    )
+    toroidal_model.build_openmc_model()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        toroidal_model.build_tallies()
+    build_time = (time.perf_counter() - start) / repeat
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tallies.xml")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            toroidal_model.tallies.export_to_xml(path)
+        export_time = (time.perf_counter() - start) / repeat
+        size = os.path.getsize(path)
+
+    num_filters = sum(len(tally.filters) for tally in toroidal_model.tallies)
+    return {
+        "tallies": len(toroidal_model.tallies),
+        "filters": num_filters,
+        "build_s": build_time,
+        "export_s": export_time,
+        "xml_bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="tally_layout")
+    parser.add_argument("--layers", type=int, default=50)
+    parser.add_argument("--scores", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    build, materials = make_build(args.layers, args.scores)
+    for tally_mode in ("per_layer", "grouped"):
+        result = time_layout(build, materials, tally_mode, args.repeat)
+        print(
+            f"{tally_mode:>9}: {result['tallies']} tallies, "
+            f"{result['filters']} filters, build {result['build_s']:.4f} s, "
+            f"export {result['export_s']:.4f} s, "
+            f"{result['xml_bytes']} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,59 @@
 import yaml
 import argparse
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-import matplotlib.colors
+import importlib
 import numpy as np
-import openmc
 import textwrap
-import random
+import multiprocessing
+from multiprocessing import shared_memory
+import itertools
+import glob
+import hashlib
+import contextlib
+import functools
+import json
+import os
+import shutil
+import inspect
+import xml.etree.ElementTree as ET
+import time
+
+
+class _LazyModule(object):
+    """
+    Stand-in for a module that is only imported on first attribute access,
+    so plotting does not pay for importing openmc and model building does not
+    pay for importing pyplot.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+openmc = _LazyModule("openmc")
+plt = _LazyModule("matplotlib.pyplot")
+mpatches = _LazyModule("matplotlib.patches")
+mcollections = _LazyModule("matplotlib.collections")
+mcolors = _LazyModule("matplotlib.colors")
+
+# libyaml bindings are much faster on large build files, fall back to the
+# pure Python loader and dumper when PyYAML was built without them
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+
+def _dump_yaml(data, file, **kwargs):
+    """Write data to an open file as block style yaml"""
+    yaml.dump(
+        data, file, Dumper=YamlDumper, default_flow_style=False, **kwargs
+    )
 
 
 def expand_ib_ob(build):
@@ -37,12 +84,661 @@ def expand_ib_ob(build):
     return build
 
 
+class PipelineStats(object):
+    """
+    Opt-in record of where time goes in the plotting and model building
+    pipelines. Stages record their total wall time and number of calls, and
+    counters accumulate quantities such as layers drawn or bytes written.
+    Pass an instance as the stats argument of RadialBuildPlot or
+    ToroidalModel to fill it in.
+
+    Parameters
+        enabled (bool): if False, stages and counters are not recorded.
+            Used as the default when no stats are requested.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = {}
+        self.calls = {}
+        self.counters = {}
+
+    def stage(self, name):
+        """
+        Context manager timing one run of a stage.
+
+        Arguments:
+            name (str): stage name
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed_stage(name)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, value=1):
+        """
+        Add to a counter.
+
+        Arguments:
+            name (str): counter name
+            value (int or float): amount to add
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        """
+        Add the stages and counters of another record to this one.
+
+        Arguments:
+            other (PipelineStats or dict): record to add, or its to_dict
+        """
+        if isinstance(other, PipelineStats):
+            other = other.to_dict()
+        for name, stage in other["stages"].items():
+            self.timings[name] = self.timings.get(name, 0.0) + stage["seconds"]
+            self.calls[name] = self.calls.get(name, 0) + stage["calls"]
+        for name, value in other["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """
+        Returns:
+            stats (dict): {"stages": {name: {"seconds": (float),
+                                             "calls": (int)}},
+                           "counters": {name: value}}
+        """
+        return {
+            "stages": {
+                name: {"seconds": seconds, "calls": self.calls[name]}
+                for name, seconds in self.timings.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def to_json(self, filename):
+        """
+        Write the record to a JSON file.
+
+        Arguments:
+            filename (str): path of the JSON file
+        """
+        with open(filename, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def report(self):
+        """
+        Returns:
+            report (str): table of stage times and counters
+        """
+        lines = [f"{'stage':<24}{'calls':>8}{'seconds':>12}"]
+        for name, seconds in sorted(
+            self.timings.items(), key=lambda item: -item[1]
+        ):
+            lines.append(f"{name:<24}{self.calls[name]:>8}{seconds:>12.4f}")
+        if self.counters:
+            lines.append(f"{'counter':<24}{'value':>20}")
+            for name, value in self.counters.items():
+                lines.append(f"{name:<24}{value:>20}")
+        return "\n".join(lines)
+
+
+class RadialBuild(object):
+    """
+    Array backed radial build. Inboard and outboard thicknesses, their
+    cumulative sums and per layer flags are stored in NumPy arrays, and layer
+    names, material names and descriptions in lists, so builds can be queried
+    and varied without a dict per layer. Converts to and from the radial build
+    dict format.
+
+    Parameters
+        names (list of str): layer names, from the inside out
+        inboard (iter of float): inboard thickness of each layer
+        outboard (iter of float): outboard thickness of each layer
+        material_names (list of str): Optional, OpenMC material name of each
+            layer, None for void layers
+        descriptions (list of str): Optional, description of each layer, None
+            where not given
+        extras (list of dict): Optional, any other entries of each layer's
+            dict, such as "composition", "color" or "scores"
+        has_thickness (iter of bool): Optional, False for layers whose dict
+            had no "thickness" entry. Their thickness is stored as zero.
+    """
+
+    # layer dict entries stored in arrays or tables rather than in extras.
+    # "material" holds the OpenMC material assigned by ToroidalModel.
+    _array_keys = {
+        "thickness",
+        "inboard",
+        "outboard",
+        "material_name",
+        "description",
+        "material",
+    }
+
+    def __init__(
+        self,
+        names,
+        inboard,
+        outboard,
+        material_names=None,
+        descriptions=None,
+        extras=None,
+        has_thickness=None,
+    ):
+        self.names = list(names)
+        num_layers = len(self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.inboard = np.array(inboard, dtype=float)
+        self.outboard = np.array(outboard, dtype=float)
+        if material_names is None:
+            material_names = [None] * num_layers
+        self.material_names = list(material_names)
+        if descriptions is None:
+            descriptions = [None] * num_layers
+        self.descriptions = list(descriptions)
+        if extras is None:
+            extras = [{} for _ in range(num_layers)]
+        self.extras = list(extras)
+        if has_thickness is None:
+            has_thickness = np.ones(num_layers, dtype=bool)
+        self.has_thickness = np.array(has_thickness, dtype=bool)
+
+        self.update_radii()
+
+    @classmethod
+    def from_dict(cls, build):
+        """
+        Create a RadialBuild from a radial build dict. "inboard" and
+        "outboard" entries, as added by expand_ib_ob, take precedence over
+        "thickness".
+
+        Arguments:
+            build (dict): radial build dict, see RadialBuildPlot
+
+        Returns:
+            radial_build (RadialBuild): array backed build
+        """
+        num_layers = len(build)
+        inboard = np.zeros(num_layers)
+        outboard = np.zeros(num_layers)
+        has_thickness = np.zeros(num_layers, dtype=bool)
+        material_names = []
+        descriptions = []
+        extras = []
+
+        for i, layer in enumerate(build.values()):
+            if "thickness" in layer:
+                thickness = layer["thickness"]
+                if isinstance(thickness, (tuple, list)):
+                    inboard[i], outboard[i] = thickness[0], thickness[1]
+                else:
+                    inboard[i] = outboard[i] = thickness
+                has_thickness[i] = True
+            inboard[i] = layer.get("inboard", inboard[i])
+            outboard[i] = layer.get("outboard", outboard[i])
+            material_names.append(layer.get("material_name"))
+            descriptions.append(layer.get("description"))
+            extras.append(
+                {
+                    key: value
+                    for key, value in layer.items()
+                    if key not in cls._array_keys
+                }
+            )
+
+        return cls(
+            build.keys(),
+            inboard,
+            outboard,
+            material_names,
+            descriptions,
+            extras,
+            has_thickness,
+        )
+
+    def to_dict(self):
+        """
+        Convert to a radial build dict.
+
+        Returns:
+            build (dict): radial build dict, see RadialBuildPlot
+        """
+        build = {}
+        for i, name in enumerate(self.names):
+            layer = {}
+            if self.has_thickness[i]:
+                inboard = float(self.inboard[i])
+                outboard = float(self.outboard[i])
+                if inboard == outboard:
+                    layer["thickness"] = inboard
+                else:
+                    layer["thickness"] = [inboard, outboard]
+            if self.material_names[i] is not None:
+                layer["material_name"] = self.material_names[i]
+            if self.descriptions[i] is not None:
+                layer["description"] = self.descriptions[i]
+            layer.update(self.extras[i])
+            build[name] = layer
+        return build
+
+    @classmethod
+    def from_yaml(cls, filename):
+        """
+        Read a RadialBuild from a yml file, either a radial build plot
+        definition with a "build" member or a bare radial build dict.
+
+        Arguments:
+            filename (str): path to the yml file
+
+        Returns:
+            radial_build (RadialBuild): array backed build
+        """
+        data = read_yaml(filename)
+        if "build" in data:
+            data = data["build"]
+        return cls.from_dict(data)
+
+    def to_yaml(self, filename, **kwargs):
+        """
+        Write the build to a yml file, in the format read by the plotting
+        command line interface.
+
+        Arguments:
+            filename (str): path of the yml file to write
+            **kwargs: other top level entries to write, such as "title"
+        """
+        data = dict(kwargs, build=self.to_dict())
+        with open(filename, "w") as file:
+            _dump_yaml(data, file, sort_keys=False)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def copy(self):
+        """
+        Copy the build. Thickness arrays are copied, the name, material and
+        description tables are shared and should be treated as read only.
+
+        Returns:
+            radial_build (RadialBuild): copy of this build
+        """
+        radial_build = RadialBuild.__new__(RadialBuild)
+        radial_build.__dict__.update(self.__dict__)
+        radial_build.inboard = self.inboard.copy()
+        radial_build.outboard = self.outboard.copy()
+        radial_build.inboard_radii = self.inboard_radii.copy()
+        radial_build.outboard_radii = self.outboard_radii.copy()
+        return radial_build
+
+    def update_radii(self):
+        """
+        Recompute the cumulative inboard and outboard radii, measured from the
+        inner surface of the first layer. Call after modifying inboard or
+        outboard directly.
+        """
+        self.inboard_radii = np.cumsum(self.inboard)
+        self.outboard_radii = np.cumsum(self.outboard)
+
+    @property
+    def nonzero(self):
+        """Flags of layers with nonzero inboard or outboard thickness"""
+        return (self.inboard != 0) | (self.outboard != 0)
+
+    def set_thickness(self, name, inboard, outboard=None):
+        """
+        Set the thickness of a layer in place.
+
+        Arguments:
+            name (str): layer name
+            inboard (float): inboard thickness
+            outboard (float): Optional, outboard thickness. Same as inboard if
+                not given.
+        """
+        i = self.index[name]
+        if outboard is None:
+            outboard = inboard
+        self.inboard[i] = inboard
+        self.outboard[i] = outboard
+        self.has_thickness[i] = True
+        self.update_radii()
+
+    def thickness(self, side):
+        """
+        Arguments:
+            side (str): "inboard" or "outboard"
+
+        Returns:
+            thickness (array): thickness of each layer on that side
+        """
+        return getattr(self, side)
+
+    def outer_radius(self, name, side):
+        """
+        Distance from the inner surface of the first layer to the outer
+        surface of a layer.
+
+        Arguments:
+            name (str): layer name
+            side (str): "inboard" or "outboard"
+
+        Returns:
+            radius (float): cumulative thickness through the named layer
+        """
+        return float(getattr(self, f"{side}_radii")[self.index[name]])
+
+    def torus_parameters(self, major_rad, minor_rad_z, minor_rad_xy):
+        """
+        Get the ZTorus parameters of the outer surface of each layer, built
+        out from the plasma torus. Layers shift the major radius by half the
+        difference of their outboard and inboard thicknesses, and grow both
+        minor radii by their average thickness.
+
+        Arguments:
+            major_rad (float): major radius of the plasma torus
+            minor_rad_z (float): minor radius of the plasma parallel to the z
+                axis
+            minor_rad_xy (float): minor radius of the plasma perpendicular to
+                the z axis
+
+        Returns:
+            a (array): major radius of each layer's outer surface
+            b (array): z minor radius of each layer's outer surface
+            c (array): xy minor radius of each layer's outer surface
+        """
+        shift = (self.outboard_radii - self.inboard_radii) / 2
+        growth = (self.outboard_radii + self.inboard_radii) / 2
+        return major_rad + shift, minor_rad_z + growth, minor_rad_xy + growth
+
+    def shell_volumes(self, major_rad, minor_rad_z, minor_rad_xy):
+        """
+        Exact volume of each layer, see torus_shell_volumes. The radii may
+        be arrays, giving the volumes for each set of radii.
+
+        Arguments:
+            major_rad (float or array): major radius of the plasma torus
+            minor_rad_z (float or array): minor radius of the plasma
+                parallel to the z axis
+            minor_rad_xy (float or array): minor radius of the plasma
+                perpendicular to the z axis
+
+        Returns:
+            volumes (array): shape of the broadcast radii plus a trailing
+                layer axis
+        """
+        return torus_shell_volumes(
+            self.inboard, self.outboard, major_rad, minor_rad_z, minor_rad_xy
+        )
+
+
+LAYER_TEXT_CACHE_SIZE = 4096
+
+
+def _composition_key(composition):
+    """
+    Key of a composition dict in the label caches: (material name, percent
+    text) pairs. The fractions are formatted here, as equal fractions such
+    as 1 and 1.0 print differently.
+
+    Arguments:
+        composition (dict): "material name (str)":volume_fraction (float)
+
+    Returns:
+        composition (tuple): (material name, percent text) pairs
+    """
+    return tuple(
+        (mat, f"{round(frac*100,3)}") for mat, frac in composition.items()
+    )
+
+
+@functools.lru_cache(maxsize=LAYER_TEXT_CACHE_SIZE)
+def _composition_text(composition, max_characters):
+    """
+    Formats a composition for a plot label. Cached, since the same
+    compositions repeat across sides, slices and sweep variants.
+
+    Arguments:
+        composition (tuple): (material name, percent text) pairs, see
+            _composition_key
+        max_characters (int): width to wrap the text to
+
+    Returns:
+        comp_string (str): formatted composition text
+    """
+    mat_strings = [f"{mat}: {percent}%" for mat, percent in composition]
+    comp_text = ", ".join(mat_strings)
+
+    return textwrap.fill(comp_text, width=max_characters) + "\n"
+
+
+@functools.lru_cache(maxsize=LAYER_TEXT_CACHE_SIZE, typed=True)
+def _layer_text(
+    name, composition, description, thickness, max_characters, unit,
+    max_thickness, thickness_label=None,
+):
+    """
+    Formats the label of one layer and the width of its rectangle. Cached,
+    keyed by everything the label depends on; typed, since a thickness of 4
+    prints differently from 4.0.
+
+    Arguments:
+        name (str): name of the layer
+        composition (tuple): (material name, percent text) pairs, see
+            _composition_key, or None
+        description (str): layer description, or None
+        thickness (float): thickness of the layer on the plotted side
+        max_characters (int): width to wrap the text to
+        unit (str): unit of the thickness
+        max_thickness (float): upper limit on the width of the rectangle
+        thickness_label (str): Optional, text to show in place of thickness
+
+    Returns:
+        text (str): formatted text for layer
+        visual_thickness (float): width of the rectangle for the layer
+    """
+    min_line_height = 5
+
+    if thickness_label is None:
+        thickness_label = thickness
+    thickness_str = f": {thickness_label} {unit}"
+
+    comp_string = ""
+    if composition is not None:
+        comp_string = _composition_text(composition, max_characters)
+
+    description_str = ""
+    if description is not None:
+        description_str = textwrap.fill(
+            description,
+            max_characters,
+            drop_whitespace=False,
+        )
+
+    text = f"{name}{thickness_str}\n{comp_string}\n{description_str}".rstrip()
+
+    newlines = text.count("\n")
+
+    min_thickness = (newlines + 1) * min_line_height
+
+    visual_thickness = min(max(thickness, min_thickness), max_thickness)
+
+    return text, visual_thickness
+
+
+def layer_text_cache_info():
+    """
+    Reports how well the layer label cache is doing in this process.
+
+    Returns:
+        info (dict): hits, misses, current size, maximum size and hit rate
+    """
+    info = _layer_text.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "currsize": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+
+def clear_layer_text_cache():
+    """
+    Empties the layer label caches and resets their statistics.
+    """
+    _layer_text.cache_clear()
+    _composition_text.cache_clear()
+
+
+def _shuffle_palette(seed, colors=None):
+    """
+    Colors in the order a ColorAllocator hands them out.
+
+    Arguments:
+        seed (int): seed for shuffling the palette, None for a different
+            order every time
+        colors (tuple of str): Optional, colors to shuffle. Defaults to the
+            xkcd colors.
+
+    Returns:
+        palette (tuple of str): shuffled colors
+    """
+    if colors is None:
+        colors = sorted(set(mcolors.XKCD_COLORS.values()))
+    order = np.random.default_rng(seed).permutation(len(colors))
+    return tuple(colors[i] for i in order)
+
+
+# seeded palettes are the same every time, so plots with the same seed
+# shuffle the palette only once per process
+_seeded_palette = functools.lru_cache(maxsize=64)(_shuffle_palette)
+
+
+class ColorAllocator(object):
+    """
+    Hands out unused colors from a palette shuffled once up front, by moving
+    a cursor through it, so each color costs constant time and the order is
+    reproducible for a given seed. Colors can also be remembered by layer
+    name in a palette file, so every plot of a build family reuses the same
+    colors.
+
+    Parameters
+        seed (int): Optional, seed for shuffling the palette. If None the
+            order is different every time.
+        palette_file (str): Optional, yml file mapping layer name to color.
+            Layers named in it get its color, and colors assigned to new
+            layer names are added to it by save_palette.
+        colors (iter of str): Optional, colors to draw from. Defaults to the
+            xkcd colors.
+    """
+
+    def __init__(self, seed=None, palette_file=None, colors=None):
+        self.seed = seed
+        self.colors = None if colors is None else tuple(colors)
+        self._palette = None
+        self.cursor = 0
+        self.used = set()
+        self.palette_file = palette_file
+        self.named_colors = {}
+        self.new_names = False
+
+        if palette_file is not None and os.path.exists(palette_file):
+            self.named_colors = read_yaml(palette_file) or {}
+        # colors of names in the palette file are taken, even by names not
+        # in this plot
+        self.used.update(self.named_colors.values())
+
+    @property
+    def palette(self):
+        """
+        Shuffled colors to hand out, made on first use, so plots whose layers
+        all have colors never shuffle the palette.
+        """
+        if self._palette is None:
+            if self.seed is None:
+                self._palette = _shuffle_palette(None, self.colors)
+            else:
+                self._palette = _seeded_palette(self.seed, self.colors)
+        return self._palette
+
+    def reserve(self, color):
+        """
+        Mark a color as used so it is not handed out.
+
+        Arguments:
+            color (str): matplotlib color string or hex code
+        """
+        self.used.add(color)
+
+    def allocate(self, name=None):
+        """
+        Get a color for a layer: its color from the palette file if it has
+        one, otherwise the next unused color of the shuffled palette.
+
+        Arguments:
+            name (str): Optional, layer name
+
+        Returns:
+            color (str): color for the layer
+        """
+        if name in self.named_colors:
+            color = self.named_colors[name]
+            self.used.add(color)
+            return color
+
+        while self.cursor < len(self.palette):
+            color = self.palette[self.cursor]
+            self.cursor += 1
+            if color not in self.used:
+                break
+        else:
+            raise ValueError(
+                f"all {len(self.palette)} colors in the palette are used"
+            )
+
+        self.used.add(color)
+        if name is not None:
+            self.named_colors[name] = color
+            self.new_names = True
+        return color
+
+    def save_palette(self, palette_file=None):
+        """
+        Write the layer name to color mapping to a yml file, replacing it
+        atomically so concurrent plots never read a partial file.
+
+        Arguments:
+            palette_file (str): Optional, file to write. Defaults to the
+                palette file the allocator was created with.
+        """
+        if palette_file is None:
+            palette_file = self.palette_file
+        temp_file = f"{palette_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as file:
+            _dump_yaml(self.named_colors, file)
+        os.replace(temp_file, palette_file)
+        self.new_names = False
+
+
 class RadialBuildPlot(object):
     """
     Uses a radial build definition to generate radial build plots.
 
     Parameters
-        build (dict): {"layer name": {
+        build (dict or RadialBuild): {"layer name": {
                             "thickness": (float),
                             "composition": {
                                 "material name": fraction (float)
@@ -53,7 +749,8 @@ class RadialBuildPlot(object):
                     }
                 }
             The dict corresponding to each "layer_name" key may be empty,
-            or have any combination of entries.
+            or have any combination of entries. A RadialBuild is converted
+            to this dict, the plot does not use its arrays.
     Optional attributes:
         title (string): title for plot and filename to save to
         colors (list of str): list of matplotlib color strings.
@@ -65,15 +762,35 @@ class RadialBuildPlot(object):
             for reducing the total size of the figure.
         size (iter of float): figure size, inches. (width, height)
         unit (str): Unit of thickness values
+        dpi (float): resolution of the png, dots per inch
+        render_mode (str): "default" draws each layer as its own patch, "fast"
+            draws all layers of a side as one PatchCollection with text
+            placement computed up front. The images are visually identical,
+            differing only in the antialiasing of some rectangle edges, and
+            "fast" is quicker for builds with many layers.
+        seed (int): seed for choosing layer colors, so plots are
+            reproducible. If None, colors are different every time.
+        palette_file (str): yml file mapping layer names to colors. Layers
+            without a "color" use the color for their name, and colors chosen
+            for new names are saved to it. See ColorAllocator.
+        stats (PipelineStats): record of stage timings and counters to fill
+            in while plotting
     """
 
     def __init__(self, build, **kwargs):
+        if isinstance(build, RadialBuild):
+            build = build.to_dict()
         self.build = expand_ib_ob(build)
         self.title = "radial_build"
         self.max_characters = 20
         self.max_thickness = 1e6
         self.size = (8, 4)
         self.unit = "cm"
+        self.dpi = 200
+        self.render_mode = "default"
+        self.seed = None
+        self.palette_file = None
+        self.stats = PipelineStats(enabled=False)
         for name in kwargs.keys() & (
             "title",
             "colors",
@@ -81,12 +798,18 @@ class RadialBuildPlot(object):
             "max_thickness",
             "size",
             "unit",
+            "dpi",
+            "render_mode",
+            "seed",
+            "palette_file",
+            "stats",
         ):
             self.__setattr__(name, kwargs[name])
 
-        self.used_colors = set()
-        self.available_colors = set(matplotlib.colors.XKCD_COLORS.values())
+        self.color_allocator = ColorAllocator(self.seed, self.palette_file)
         self.colors = self.assign_colors()
+        if self.palette_file is not None and self.color_allocator.new_names:
+            self.color_allocator.save_palette()
 
 
 
@@ -96,44 +819,40 @@ class RadialBuildPlot(object):
 
         Phase 1: Handle Pre-specified Colors
             - Loop 1 iterates through the build dictionary and checks for the 'color' key.
-            - If a pre-specified color is found, it is added to the `used_colors` set.
-            - The color is also removed from the `available_colors` set to avoid random reassignment.
+            - If a pre-specified color is found, it is reserved in the color allocator.
             - Layers with pre-specified colors will always use those colors, even if they duplicate others.
 
         Phase 2: Assign Unique Colors to Unspecified Layers
             - Loop 2 iterates through layers that do not have a pre-specified color.
-            - For these layers, a random color is chosen from the `available_colors` set.
+            - For these layers, the color allocator gives the layer's color from the palette file, or the next unused color of its shuffled palette.
             - This ensures that auto-assigned colors are unique and do not duplicate either user-specified or previously assigned colors.
-            - Once a color is assigned, it is removed from `available_colors` and added to `used_colors`.
 
         Returns:
             list of str: A list of color strings corresponding to each layer in the build.
         """
-        colors = []
         for layer in self.build.values():
             # Check for user-specified colors
             if "color" in layer:
-                color = layer["color"]
-                self.used_colors.add(color)  # Mark as used
-                self.available_colors.discard(color)  # Remove from available pool
-            else:
-                # Assign a unique random color
-                color = self.generate_unique_color()
-                layer["color"] = color  # Store the color in the layer
+                self.color_allocator.reserve(layer["color"])
 
-            colors.append(color)  # Add the color to the list for this layer
+        colors = []
+        for name, layer in self.build.items():
+            if "color" not in layer:
+                # Assign a unique color
+                layer["color"] = self.generate_unique_color(name)
+
+            colors.append(layer["color"])  # Add the color to the list for this layer
 
         return colors
 
-    def generate_unique_color(self):
+    def generate_unique_color(self, name=None):
         """
-        Generate a random color that has not been used yet. Ensures a color
-        isn't randomly selected that has already been used.
+        Get a color that has not been used yet from the color allocator.
+
+        Arguments:
+            name (str): Optional, name of the layer the color is for
         """
-        color = random.choice(list(self.available_colors))
-        self.available_colors.remove(color)  # Remove chosen color
-        self.used_colors.add(color)  # Add to used colors
-        return color
+        return self.color_allocator.allocate(name)
 
     def build_composition_string(self, composition):
         """
@@ -146,17 +865,9 @@ class RadialBuildPlot(object):
             comp_string (string): formatted string with composition definition
         """
 
-        mat_strings = [
-            f"{mat}: {round(frac*100,3)}%" for mat, frac in composition.items()
-        ]
-        comp_text = ", ".join(mat_strings)
-
-        comp_string = textwrap.fill(
-            comp_text,
-            width=self.max_characters,
-        ) + "\n"
-
-        return comp_string
+        return _composition_text(
+            _composition_key(composition), self.max_characters
+        )
 
     def write_yml(self):
         """
@@ -167,13 +878,13 @@ class RadialBuildPlot(object):
         data_dict = self.__dict__.copy()
 
         del data_dict["figure"]
-        del data_dict["available_colors"]
-        del data_dict["used_colors"]
+        del data_dict["color_allocator"]
         del data_dict["colors"]
+        del data_dict["stats"]
         filename = self.title.replace(" ", "") + ".yml"
 
         with open(filename, "w") as file:
-            yaml.safe_dump(data_dict, file, default_flow_style=False, sort_keys=False)
+            _dump_yaml(data_dict, file, sort_keys=False)
 
     def get_layer_string(self, name, layer, side=None):
         """
@@ -192,41 +903,84 @@ class RadialBuildPlot(object):
             text (str): formatted text for layer
             visual_thickness (float): width of the rectangle for the layer
         """
-        min_line_height = 5
-
-
-        thickness_str = ""
-        thickness = layer[side]
-        thickness_str = f': {thickness} {self.unit}'
-
+        composition = layer.get("composition")
+        if composition is not None:
+            composition = _composition_key(composition)
 
-        comp_string = ""
-        if "composition" in layer:
-            comp_string = self.build_composition_string(layer["composition"])
-
-        description_str = ""
+        description = None
         if "description" in layer:
-            description_str = textwrap.fill(
-                f'{layer["description"]}',
-                self.max_characters,
-                drop_whitespace=False,
-            )
+            description = f'{layer["description"]}'
 
-        text = f"{name}{thickness_str}\n{comp_string}\n{description_str}".rstrip()
+        thickness_label = None
+        if "envelope" in layer:
+            envelope = layer["envelope"]
+            thickness_label = f'{envelope["min"]:.4g}-{envelope["max"]:.4g}'
+
+        return _layer_text(
+            name,
+            composition,
+            description,
+            layer[side],
+            self.max_characters,
+            self.unit,
+            self.max_thickness,
+            thickness_label,
+        )
 
-        newlines = text.count("\n")
 
-        min_thickness = (newlines + 1) * min_line_height
-        
-        visual_thickness = min(max(thickness, min_thickness), self.max_thickness) 
+    def envelope_patches(self, layer, left, visual_thickness, height):
+        """
+        Patches marking the spread of an envelope layer's thickness, see
+        from_parastell_envelope.
 
-        return text, visual_thickness
+        Arguments:
+            layer (dict): layer definition with an "envelope" member
+            left (float): x coordinate of the layer's left edge
+            visual_thickness (float): width of the layer's rectangle
+            height (float): height of the layer's rectangle
 
+        Returns:
+            patches (list of matplotlib Patch): hatched rectangle from the
+                minimum to the maximum thickness and a dashed line at the
+                mean thickness
+        """
+        envelope = layer["envelope"]
+        if envelope["max"] == 0:
+            return []
+        scale = visual_thickness / envelope["max"]
+        low = left + envelope["min"] * scale
+        mean = left + envelope["mean"] * scale
+        return [
+            mpatches.Rectangle(
+                (low, 0),
+                left + visual_thickness - low,
+                height,
+                facecolor="none",
+                edgecolor="black",
+                hatch="//",
+                linewidth=0,
+            ),
+            mpatches.Polygon(
+                [(mean, 0), (mean, height)],
+                closed=False,
+                fill=False,
+                edgecolor="black",
+                linestyle="--",
+            ),
+        ]
 
     def plot_side(self, ax, side, reverse=False,plot_title=True):
         """
         Plot either the inboard or outboard radial build.
         """
+        if self.render_mode == "fast":
+            return self.plot_side_fast(ax, side, reverse, plot_title)
+        if self.render_mode != "default":
+            raise ValueError(
+                f"unknown render_mode {self.render_mode}, use 'default' or "
+                "'fast'"
+            )
+
         char_to_height = 2.25
         height = char_to_height * self.max_characters
 
@@ -256,7 +1010,7 @@ class RadialBuildPlot(object):
             if visual_thickness == 0:
                 continue
 
-            rect = Rectangle(
+            rect = mpatches.Rectangle(
                 ll,
                 visual_thickness,
                 height,
@@ -264,6 +1018,13 @@ class RadialBuildPlot(object):
                 edgecolor="black",
             )
             ax.add_patch(rect)
+            self.stats.count("patches")
+            if "envelope" in layer:
+                for patch in self.envelope_patches(
+                    layer, ll[0], visual_thickness, height
+                ):
+                    ax.add_patch(patch)
+                    self.stats.count("patches")
 
             centerx = ll[0] + visual_thickness / 2 + 1
             centery = height / 2
@@ -279,6 +1040,7 @@ class RadialBuildPlot(object):
                     fontsize=font_size,
             )
             text.set_clip_path(rect)
+            self.stats.count("text_artists")
 
             ll[0] += float(visual_thickness)
             total_thickness += visual_thickness
@@ -287,48 +1049,165 @@ class RadialBuildPlot(object):
         if plot_title:
             ax.set_title(side.capitalize(), fontsize=2, pad=1)
 
-    def ib_ob_are_identical(self):
-
-        return all(
-            layer["inboard"] == layer["outboard"]
-            for layer in self.build.values()
-        )
-
-    def plot_radial_build(self):
+    def plot_side_fast(self, ax, side, reverse=False, plot_title=True):
         """
-        Creates radial build plots for both the inboard and outboard sides.
+        Plot either the inboard or outboard radial build, drawing all layer
+        rectangles as a single PatchCollection. Text positions and font sizes
+        are computed for all layers at once. No clip path is set on the text,
+        as in plot_side it has no effect because ax.text turns clipping off.
         """
-        if self.ib_ob_are_identical():
-            fig, ax = plt.subplots(
-                figsize=(self.size[0], self.size[1] / 2),
-            )
-            self.plot_side(
-                ax,
-                side="inboard",
-                reverse=True,
-                plot_title=False,
+        char_to_height = 2.25
+        height = char_to_height * self.max_characters
+        ax.set_ylim(0, height + 1)
+
+        layers = list(self.build.items())
+        colors = list(self.colors)
+
+        if reverse:
+            layers.reverse()
+            colors.reverse()
+
+        layer_strs = []
+        visual_thicknesses = []
+        layer_colors = []
+        envelope_layers = []
+        for (name, layer), color in zip(layers, colors):
+            if layer[side] == 0:
+                continue
+            layer_str, visual_thickness = self.get_layer_string(
+                name,
+                layer,
+                side,
             )
-        else:
-            fig, axes = plt.subplots(
-                2,
-                1,
-                figsize=(self.size[0], self.size[1]),
+            if visual_thickness == 0:
+                continue
+            layer_strs.append(layer_str)
+            visual_thicknesses.append(visual_thickness)
+            layer_colors.append(color)
+            envelope_layers.append(layer if "envelope" in layer else None)
+
+        visual_thicknesses = np.array(visual_thicknesses, dtype=float)
+        lefts = np.cumsum(visual_thicknesses) - visual_thicknesses
+        centers = lefts + visual_thicknesses / 2 + 1
+        font_sizes = np.minimum(np.maximum(visual_thicknesses / 2, 11), 18)
+
+        rects = [
+            mpatches.Rectangle(
+                (left, 0),
+                visual_thickness,
+                height,
+                facecolor=color,
+                edgecolor="black",
             )
+            for left, visual_thickness, color in zip(
+                lefts, visual_thicknesses, layer_colors
+            )
+        ]
+        ax.add_collection(
+            mcollections.PatchCollection(rects, match_original=True)
+        )
+        self.stats.count("patches", len(rects))
+
+        # a PatchCollection has one hatch for all of its patches, so the
+        # envelope marks are added on their own
+        for layer, left, visual_thickness in zip(
+            envelope_layers, lefts, visual_thicknesses
+        ):
+            if layer is None:
+                continue
+            for patch in self.envelope_patches(
+                layer, left, visual_thickness, height
+            ):
+                ax.add_patch(patch)
+                self.stats.count("patches")
 
-            self.plot_side(
-                axes[0],
-                side="inboard",
-                reverse=True,
+        centery = height / 2
+        for centerx, layer_str, font_size in zip(centers, layer_strs, font_sizes):
+            ax.text(
+                centerx,
+                centery,
+                layer_str,
+                rotation="vertical",
+                ha="center",
+                va="center",
+                fontsize=font_size,
             )
+        self.stats.count("text_artists", len(layer_strs))
 
-            self.plot_side(
-                axes[1],
-                side="outboard",
-                reverse=False,
+        ax.set_xlim(-1, visual_thicknesses.sum() + 1)
+        ax.set_axis_off()
+        if plot_title:
+            ax.set_title(side.capitalize(), fontsize=2, pad=1)
+
+    def ib_ob_are_identical(self):
+
+        return all(
+            layer["inboard"] == layer["outboard"]
+            for layer in self.build.values()
+        )
+
+    def plot_radial_build(self, figure=None):
+        """
+        Creates radial build plots for both the inboard and outboard sides.
+
+        Arguments:
+            figure (matplotlib Figure): Optional, existing figure to clear and
+                draw into instead of creating a new one. Useful when rendering
+                many plots in a row.
+        """
+        if self.ib_ob_are_identical():
+            figsize = (self.size[0], self.size[1] / 2)
+            nrows = 1
+        else:
+            figsize = (self.size[0], self.size[1])
+            nrows = 2
+
+        if figure is None:
+            fig = plt.figure(figsize=figsize)
+        else:
+            fig = figure
+            fig.clear()
+            fig.set_size_inches(figsize)
+
+        self.stats.count("layers", len(self.build))
+        label_cache = _layer_text.cache_info()
+        if nrows == 1:
+            ax = fig.subplots()
+            with self.stats.stage("plot_side"):
+                self.plot_side(
+                    ax,
+                    side="inboard",
+                    reverse=True,
+                    plot_title=False,
+                )
+        else:
+            axes = fig.subplots(2, 1)
+
+            with self.stats.stage("plot_side"):
+                self.plot_side(
+                    axes[0],
+                    side="inboard",
+                    reverse=True,
                 )
 
+            with self.stats.stage("plot_side"):
+                self.plot_side(
+                    axes[1],
+                    side="outboard",
+                    reverse=False,
+                    )
+
+        label_cache_after = _layer_text.cache_info()
+        self.stats.count(
+            "label_cache_hits", label_cache_after.hits - label_cache.hits
+        )
+        self.stats.count(
+            "label_cache_misses",
+            label_cache_after.misses - label_cache.misses,
+        )
+
         fig.suptitle(self.title, y=1,fontsize =26)
-        plt.subplots_adjust(hspace=0.12, top=0.88, bottom=0.06)
+        fig.subplots_adjust(hspace=0.12, top=0.88, bottom=0.06)
 
         self.figure = fig
 
@@ -343,275 +1222,3242 @@ class RadialBuildPlot(object):
         if filename is None:
             filename = self.title.replace(" ", "")
 
-        self.figure.savefig(f"{filename}.png", dpi=200)
+        with self.stats.stage("png_encode"):
+            self.figure.savefig(f"{filename}.png", dpi=self.dpi)
+        if self.stats.enabled:
+            self.stats.count("bytes_written", os.path.getsize(f"{filename}.png"))
 
     @classmethod
-    def from_parastell_build(cls, parastell_build_dict, phi, theta):
+    def from_parastell_build(
+        cls, parastell_build_dict, phi, theta, method="nearest", **kwargs
+    ):
+        """
+        Create a radial build plot from a single (phi, theta) slice of a
+        ParaStell build.
 
-        # access the thickness values at given theta phi
-        phi_list = parastell_build_dict["phi_list"]
-        theta_list = parastell_build_dict["theta_list"]
-        radial_build = parastell_build_dict["radial_build"]
+        Arguments:
+            parastell_build_dict (dict or ParastellBuild): ParaStell build
+                with "phi_list", "theta_list" and "radial_build" members.
+                Layers may contain an optional "color" member.
+            phi (float): toroidal angle of the slice
+            theta (float): poloidal angle of the slice
+            method (str): "nearest" to use the nearest angles in phi_list and
+                theta_list, or "linear" or "spline" to interpolate between
+                them, see ParastellBuild.interpolate
+            **kwargs: passed to the RadialBuildPlot constructor
 
-        phi_index = np.where(phi_list == phi)[0]
-        theta_index = np.where(theta_list == theta)[0]
-        build = {}
-        # build the dictionary for plotting
-        for layer_name, layer in radial_build.items():
-            thickness = float(layer["thickness_matrix"][phi_index, theta_index][0])
-            material = layer["h5m_tag"]
-            build[layer_name] = {
-                "thickness": thickness,
-                "description": material,
-            }
+        Returns:
+            radial_build (RadialBuildPlot): plot of the requested slice
+        """
 
-        radial_build = cls(build)
+        if not isinstance(parastell_build_dict, ParastellBuild):
+            parastell_build_dict = ParastellBuild(parastell_build_dict)
+
+        build = parastell_build_dict.build(phi, theta, method)
+
+        radial_build = cls(build, **kwargs)
 
         return radial_build
 
+    @classmethod
+    def from_parastell_envelope(
+        cls, parastell_build_dict, phi_range=None, theta_range=None, **kwargs
+    ):
+        """
+        Create a radial build plot of the spread of each layer's thickness
+        over all angles of a ParaStell build, or a phi/theta sub-range. Each
+        layer is drawn as wide as its maximum thickness, with the part beyond
+        its minimum thickness hatched and its mean thickness marked by a
+        dashed line.
+
+        Arguments:
+            parastell_build_dict (dict or ParastellBuild): ParaStell build
+                with "phi_list", "theta_list" and "radial_build" members.
+                Layers may contain an optional "color" member.
+            phi_range (iter of float): Optional, (start, end) of the toroidal
+                angles to include, see ParastellBuild.thickness_envelope
+            theta_range (iter of float): Optional, (start, end) of the
+                poloidal angles to include
+            **kwargs: passed to the RadialBuildPlot constructor
 
-class ToroidalModel(object):
+        Returns:
+            radial_build (RadialBuildPlot): envelope plot of the build
+        """
+
+        if not isinstance(parastell_build_dict, ParastellBuild):
+            parastell_build_dict = ParastellBuild(parastell_build_dict)
+
+        minimum, mean, maximum = parastell_build_dict.thickness_envelope(
+            phi_range, theta_range
+        )
+        build = parastell_build_dict._build_from_thicknesses(maximum)
+        for layer, low, average, high in zip(
+            build.values(), minimum, mean, maximum
+        ):
+            layer["envelope"] = {
+                "min": float(low),
+                "mean": float(average),
+                "max": float(high),
+            }
+
+        return cls(build, **kwargs)
+
+
+PARASTELL_FORMAT_VERSION = 1
+
+class _SharedMemoryArray(np.ndarray):
     """
-    An object that uses a radial build definition generate OpenMC models
-    with toroidal geometry.
+    Array over a shared memory block that holds on to the block. Arrays made
+    from a block's buffer do not keep it mapped, and a block closed while
+    they are in use leaves them pointing at unmapped memory. Every view of a
+    _SharedMemoryArray refers back to it, so the block is only closed, when
+    garbage collected, once the last view is gone.
+    """
+
+
+def _shared_memory_array(block, shape):
+    """
+    A float array of the given shape over a shared memory block, as a plain
+    ndarray that keeps the block mapped for as long as it, or any view of
+    it, is alive.
+    """
+    owner = np.ndarray.__new__(
+        _SharedMemoryArray, shape, dtype=float, buffer=block.buf
+    )
+    owner.block = block
+    return owner.view(np.ndarray)
+
+
+class ParastellBuild(object):
+    """
+    Indexed form of a ParaStell build for fast extraction of (phi, theta)
+    slices. Angles are matched to the nearest value of phi_list and
+    theta_list, within a tolerance, instead of by exact float comparison. For
+    batches of angles the thickness matrices of all layers are stacked into a
+    single layers x phi x theta array so every slice is extracted in one
+    indexing operation.
 
     Parameters
-        build (dict): {"layer name": {
-                            "thickness": (float),
-                            "composition": {
-                                "material name": fraction (float)
-                                },
-                            "material_name": (str) name of material in
-                                associated OpenMC material library. To have a
-                                layer with vacuum/void do not include the
-                                'material_name' key.
-                            "color": (str): Optional matplotlib color string
-                                          or hex code to specify the layer's color.
-                    }
-                }
-            The dict corresponding to each "layer_name" key may be empty,
-            or have any combination of entries.
-        major_rad (float): major radius of the torus
-        minor_rad_z (float): minor radius of the plasma region parallel to the
-            z axis
-        minor_rad_xy (float): minor radius of the plasma region perpendicular
-            to the z axis
-        materials (str or OpenMC Materials object): path to the OpenMC materials
-            xml file for this model, or the corresponding Materials OpenMC
-            object
+        parastell_build_dict (dict): {"phi_list": (iter of float),
+                                      "theta_list": (iter of float),
+                                      "radial_build": {"layer name": {
+                                            "thickness_matrix": (2D array)
+                                                indexed [phi, theta],
+                                            "h5m_tag": (str),
+                                            "color": (str): Optional
+                                                matplotlib color string or
+                                                hex code.
+                                            }
+                                        }
+                                      }
+        atol (float): largest allowed difference, in degrees, between a
+            requested angle and the nearest grid angle. If None, the nearest
+            grid angle is always used.
+        stellarator_symmetric (bool): if True, phi_list covers half of a
+            field period starting on a symmetry plane, and interpolation
+            outside of it uses the symmetry (phi, theta) -> (-phi, -theta).
+            Otherwise phi_list is taken to cover one full field period,
+            including both ends.
     """
 
-    def __init__(self, build, major_rad, minor_rad_z, minor_rad_xy, materials):
-        self.build = expand_ib_ob(build)
-        self.major_rad = major_rad
-        self.minor_rad_z = minor_rad_z
-        self.minor_rad_xy = minor_rad_xy
-        if isinstance(materials, str):
-            self.input_materials = openmc.Materials.from_xml(materials)
-        else:
-            self.input_materials = materials
+    def __init__(
+        self, parastell_build_dict, atol=1e-6, stellarator_symmetric=False
+    ):
+        self.phi_list = np.asarray(parastell_build_dict["phi_list"], dtype=float)
+        self.theta_list = np.asarray(
+            parastell_build_dict["theta_list"], dtype=float
+        )
+        radial_build = parastell_build_dict["radial_build"]
+        self.layer_names = list(radial_build.keys())
+        self.h5m_tags = [layer["h5m_tag"] for layer in radial_build.values()]
+        self.colors = [layer.get("color") for layer in radial_build.values()]
+        self.thickness_matrices = [
+            np.asarray(layer["thickness_matrix"], dtype=float)
+            for layer in radial_build.values()
+        ]
+        self.atol = atol
+        self.stellarator_symmetric = stellarator_symmetric
 
-        self.assign_materials()
+        self._phi_order = np.argsort(self.phi_list, kind="stable")
+        self._theta_order = np.argsort(self.theta_list, kind="stable")
+        self._stacked_thickness = None
+        self._periodic_grid = None
+        # where the thickness array lives when it is not owned by this
+        # object, so pickled copies attach to it instead of carrying it
+        self._backing = None
+        self._owns_shared_memory = False
 
-    def assign_materials(self):
+    @property
+    def thickness(self):
+        """
+        Thickness of every layer as a single (layers, phi, theta) array,
+        stacked on first use.
+        """
+        if self._stacked_thickness is None:
+            self._stacked_thickness = np.stack(self.thickness_matrices)
+            self.thickness_matrices = list(self._stacked_thickness)
+        return self._stacked_thickness
+
+    def save(self, directory):
         """
-        Assign OpenMC material objects to each layer in the build dict
+        Write the build to a directory of .npy arrays, which load can memory
+        map, and a build.yml holding the layer names, h5m tags and colors.
+        Layers are written one at a time, so the build is never stacked in
+        memory.
+
+        Arguments:
+            directory (str): directory to write, created if needed
         """
-        for layer_name, layer_data in self.build.items():
-            if "material_name" in layer_data:
-                layer_data["material"] = self.get_material_by_name(
-                    layer_data["material_name"]
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "phi_list.npy"), self.phi_list)
+        np.save(os.path.join(directory, "theta_list.npy"), self.theta_list)
+        shape = (len(self.layer_names), len(self.phi_list), len(self.theta_list))
+        thickness = np.lib.format.open_memmap(
+            os.path.join(directory, "thickness.npy"),
+            mode="w+",
+            dtype=float,
+            shape=shape,
+        )
+        for index, matrix in enumerate(self.thickness_matrices):
+            thickness[index] = matrix
+        thickness.flush()
+        del thickness
+
+        metadata = {
+            "format_version": PARASTELL_FORMAT_VERSION,
+            "atol": self.atol,
+            "stellarator_symmetric": self.stellarator_symmetric,
+            "layers": [
+                {"name": name, "h5m_tag": tag, "color": color}
+                for name, tag, color in zip(
+                    self.layer_names, self.h5m_tags, self.colors
                 )
-            else:
-                layer_data["material"] = None
+            ],
+        }
+        with open(os.path.join(directory, "build.yml"), "w") as file:
+            _dump_yaml(metadata, file, sort_keys=False)
 
-    def get_material_by_name(self, material_name):
+    @classmethod
+    def load(cls, directory, mmap_mode="r", **kwargs):
         """
-        Search the materials object for a material with a matching name. Openmc
-        allows duplicate names, and names are not required, be advised.
+        Read a build written by save. The thickness array is memory mapped by
+        default, so extracting a few slices only reads the pages holding
+        them.
 
         Arguments:
-            materials (OpenMC Materials Object): material library to search
-            material (string): name of material to be returned
+            directory (str): directory written by save
+            mmap_mode (str): numpy memory map mode for the thickness array,
+                or None to read it into memory
+            **kwargs: atol and stellarator_symmetric, overriding the saved
+                values
 
         Returns:
-            mat (OpenMC material object): material object with matching name
+            parastell_build (ParastellBuild): the loaded build
         """
-        for mat in self.input_materials:
-            if mat.name == material_name:
-                return mat
-        # if this returns none, openmc will just assign vacuum to any cell
-        # using this material
-        raise ValueError(f"no material name {material_name} was found in the library")
+        metadata = read_yaml(os.path.join(directory, "build.yml"))
+        if metadata.get("format_version") != PARASTELL_FORMAT_VERSION:
+            raise ValueError(
+                f"{directory} has format version "
+                f"{metadata.get('format_version')}, expected "
+                f"{PARASTELL_FORMAT_VERSION}"
+            )
+        thickness = np.load(
+            os.path.join(directory, "thickness.npy"), mmap_mode=mmap_mode
+        )
 
-    def build_surfaces(self):
+        radial_build = {}
+        for layer, matrix in zip(metadata["layers"], thickness):
+            radial_build[layer["name"]] = {
+                "thickness_matrix": matrix,
+                "h5m_tag": layer["h5m_tag"],
+            }
+            if layer["color"] is not None:
+                radial_build[layer["name"]]["color"] = layer["color"]
+
+        options = {
+            "atol": metadata["atol"],
+            "stellarator_symmetric": metadata["stellarator_symmetric"],
+        }
+        options.update(kwargs)
+        parastell_build = cls(
+            {
+                "phi_list": np.load(os.path.join(directory, "phi_list.npy")),
+                "theta_list": np.load(
+                    os.path.join(directory, "theta_list.npy")
+                ),
+                "radial_build": radial_build,
+            },
+            **options,
+        )
+        parastell_build._use_stacked_thickness(thickness)
+        if mmap_mode is not None:
+            parastell_build._backing = ("file", directory, mmap_mode)
+        return parastell_build
+
+    def _use_stacked_thickness(self, thickness):
         """
-        Build the surfaces representing the radial build using OpenMC CSG.
+        Use a (layers, phi, theta) array as the thickness of the build, with
+        each layer's matrix a view of it rather than a copy.
         """
-        major_rad = self.major_rad
-        minor_rad_z = self.minor_rad_z
-        minor_rad_xy = self.minor_rad_xy
-        # build surfaces
-        surfaces = {}
+        self._stacked_thickness = thickness
+        self.thickness_matrices = list(thickness)
+        self._periodic_grid = None
 
-        surfaces["plasma_surface"] = openmc.ZTorus(
-            a=major_rad, b=minor_rad_z, c=minor_rad_xy
+    def to_shared_memory(self):
+        """
+        Copy the build's thicknesses into a multiprocessing shared memory
+        block, once. The returned build pickles as a reference to the block,
+        so worker processes it is sent to attach to the same memory instead
+        of each receiving a copy. Call release on it, or use it in a with
+        statement, to free the block when done.
+
+        Returns:
+            shared_build (ParastellBuild): build backed by shared memory
+        """
+        shape = (len(self.layer_names), len(self.phi_list), len(self.theta_list))
+        block = shared_memory.SharedMemory(
+            create=True, size=max(1, int(np.prod(shape)) * 8)
         )
+        thickness = _shared_memory_array(block, shape)
+        for index, matrix in enumerate(self.thickness_matrices):
+            thickness[index] = matrix
 
-        for surface, surface_dict in self.build.items():
-            ib = surface_dict["inboard"]
-            ob = surface_dict["outboard"]
-            if ib == 0 and ob == 0:
-                continue
-            major_rad += (ob - ib) / 2
-            delta = (ib + ob) / 2
-            minor_rad_z += delta
-            minor_rad_xy += delta
-            surfaces[surface] = openmc.ZTorus(
-                a=major_rad,
-                b=minor_rad_z,
-                c=minor_rad_xy,
+        radial_build = {
+            name: {"thickness_matrix": matrix, "h5m_tag": tag, "color": color}
+            for name, matrix, tag, color in zip(
+                self.layer_names, thickness, self.h5m_tags, self.colors
             )
+        }
+        shared_build = ParastellBuild(
+            {
+                "phi_list": self.phi_list,
+                "theta_list": self.theta_list,
+                "radial_build": radial_build,
+            },
+            atol=self.atol,
+            stellarator_symmetric=self.stellarator_symmetric,
+        )
+        shared_build._use_stacked_thickness(thickness)
+        shared_build._backing = ("shared_memory", block.name, shape)
+        shared_build._owns_shared_memory = True
+        return shared_build
 
-    def build_regions(self):
+    def release(self):
         """
-        Build OpenMC regions from the surfaces defined by the build dict
+        Drop the build's view of the shared memory block backing it. If this
+        build created the block with to_shared_memory, the block's name is
+        also removed, so no new process can attach to it. The memory itself
+        is freed once no array in any process views it, so thicknesses taken
+        from the build before releasing it stay valid.
         """
-        # build regions
-        regions = {}
+        if self._backing is None or self._backing[0] != "shared_memory":
+            return
+        thickness = self._stacked_thickness
+        self._stacked_thickness = None
+        self.thickness_matrices = []
+        self._periodic_grid = None
+        if self._owns_shared_memory:
+            thickness.base.block.unlink()
+            self._owns_shared_memory = False
+        self._backing = None
 
-        regions["plasma"] = -self.surfaces["plasma_surface"]
+    def __enter__(self):
+        return self
 
-        surf_list = list(self.surfaces.keys())
+    def __exit__(self, *exc_info):
+        self.release()
 
-        for inner_surf, outer_surf in zip(surf_list[0:-1], surf_list[1:]):
-            regions[outer_surf] = (
-                -self.surfaces[outer_surf] & +self.surfaces[inner_surf]
-            )
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_owns_shared_memory"] = False
+        if self._backing is not None:
+            state["_stacked_thickness"] = None
+            state["thickness_matrices"] = []
+            state["_periodic_grid"] = None
+        return state
 
-        self.regions = regions
-        self.surf_list = surf_list
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._backing is None:
+            return
+        kind, location, option = self._backing
+        if kind == "file":
+            thickness = np.load(
+                os.path.join(location, "thickness.npy"), mmap_mode=option
+            )
+        else:
+            thickness = _shared_memory_array(
+                shared_memory.SharedMemory(name=location), option
+            )
+        self._use_stacked_thickness(thickness)
 
-    def build_cells(self):
-        """
-        Build OpenMC cells from the regions defined by the build dict
+    def _nearest_index(self, grid, order, values, grid_name):
         """
-        # build cells
-        cell_dict = {}
-        materials = set()
+        Find the index of the nearest grid value for each requested value.
 
-        cell_dict["plasma_cell"] = openmc.Cell(
-            region=self.regions["plasma"], name="plasma_cell"
-        )
+        Arguments:
+            grid (1D array): grid angles
+            order (1D array): indices that sort grid
+            values (array): requested angles
+            grid_name (str): name of the grid, used in error messages
 
-        for layer, layer_def in self.build.items():
-            if layer_def["thickness"] != 0:
-                cell_dict[layer] = openmc.Cell(
-                    region=self.regions[layer],
-                    name=layer,
-                    fill=layer_def["material"],
+        Returns:
+            indices (array of int): indices into grid, same shape as values
+        """
+        values = np.asarray(values, dtype=float)
+        sorted_grid = grid[order]
+        if len(grid) == 1:
+            positions = np.zeros(values.shape, dtype=int)
+        else:
+            positions = np.clip(
+                np.searchsorted(sorted_grid, values), 1, len(grid) - 1
+            )
+            closer_to_left = (values - sorted_grid[positions - 1]) <= (
+                sorted_grid[positions] - values
+            )
+            positions = positions - closer_to_left
+        indices = order[positions]
+
+        if self.atol is not None:
+            misses = np.abs(grid[indices] - values) > self.atol
+            if np.any(misses):
+                missed = np.unique(values[misses])
+                raise ValueError(
+                    f"angles {missed.tolist()} are not within {self.atol} of "
+                    f"any value in {grid_name}"
                 )
-            materials.add(layer_def["material"])
 
-        self.cell_list = list(cell_dict.values())
-        self.cell_dict = cell_dict
-        self.materials = materials.discard(None)
+        return indices
 
-    def get_bounded_geometry(self):
-        """
-        Get an OpenMC geometry instances containing all cells, plus a bounding
-        vacuum cell
+    def angle_indices(self, phi, theta):
         """
-        unbounded_geometry = openmc.Geometry(self.cell_list)
+        Look up the grid indices of (phi, theta) pairs.
 
-        bounding_box = unbounded_geometry.bounding_box
+        Arguments:
+            phi (float or array of float): toroidal angles
+            theta (float or array of float): poloidal angles, broadcast
+                against phi
 
-        vac_surf = openmc.Sphere(
-            r=np.sum(
-                np.multiply(
-                    (bounding_box[1] - bounding_box[0]),
-                    (bounding_box[1] - bounding_box[0]),
-                )
-            )
-            ** 0.5,
-            boundary_type="vacuum",
+        Returns:
+            phi_index (array of int): indices into phi_list
+            theta_index (array of int): indices into theta_list
+        """
+        phi, theta = np.broadcast_arrays(
+            np.asarray(phi, dtype=float), np.asarray(theta, dtype=float)
+        )
+        phi_index = self._nearest_index(
+            self.phi_list, self._phi_order, phi, "phi_list"
+        )
+        theta_index = self._nearest_index(
+            self.theta_list, self._theta_order, theta, "theta_list"
         )
+        return phi_index, theta_index
 
-        vac_region = -vac_surf & +self.surfaces[self.surf_list[-1]]
-        vac_cell = openmc.Cell(region=vac_region, name="vac_cell")
+    def thicknesses(self, phi, theta):
+        """
+        Get the thickness of every layer for a batch of (phi, theta) pairs.
 
-        self.cell_list.append(vac_cell)
-        self.cell_dict["vac_cell"] = vac_cell
+        Arguments:
+            phi (float or array of float): toroidal angles
+            theta (float or array of float): poloidal angles, broadcast
+                against phi
 
-        self.geometry = openmc.Geometry(self.cell_list)
+        Returns:
+            thicknesses (array): shape of the broadcast angles plus a
+                trailing layer axis
+        """
+        phi_index, theta_index = self.angle_indices(phi, theta)
+        return np.moveaxis(self.thickness[:, phi_index, theta_index], 0, -1)
 
-    def build_tallies(self):
+    def _get_periodic_grid(self):
         """
-        Build cell tallies for each score given in build dictionary, if given
+        Sorted grids and thicknesses used for interpolation, with the
+        duplicate 360 degree theta column removed and the second derivatives
+        of the periodic cubic spline in theta. Computed on first use.
         """
-        tally_list = []
-        for layer, layer_dict in self.build.items():
-            if "scores" in layer_dict.keys():
-                for score in layer_dict["scores"]:
-                    cell_filter = openmc.CellFilter(self.cell_dict[layer])
-                    cell_tally = openmc.Tally(name=f"{layer} {score}")
-                    cell_tally.filters = [cell_filter]
-                    cell_tally.scores = [score]
-                    tally_list.append(cell_tally)
-        self.tallies = openmc.Tallies(tally_list)
+        if self._periodic_grid is not None:
+            return self._periodic_grid
 
-    def build_openmc_model(self):
+        phi = self.phi_list[self._phi_order]
+        theta_order = self._theta_order
+        theta = self.theta_list[theta_order]
+        if len(theta) > 1 and np.isclose(theta[-1] - theta[0], 360):
+            theta_order = theta_order[:-1]
+            theta = theta[:-1]
+        thickness = self.thickness[:, self._phi_order][:, :, theta_order]
+
+        # periodic cubic spline second derivatives, one cyclic system shared
+        # by every layer and phi row
+        num_theta = len(theta)
+        steps = np.diff(np.append(theta, theta[0] + 360))
+        rows = np.arange(num_theta)
+        prev_rows = (rows - 1) % num_theta
+        next_rows = (rows + 1) % num_theta
+        system = np.zeros((num_theta, num_theta))
+        np.add.at(system, (rows, prev_rows), steps[prev_rows])
+        np.add.at(system, (rows, rows), 2 * (steps[prev_rows] + steps))
+        np.add.at(system, (rows, next_rows), steps)
+        values = thickness.reshape(-1, num_theta).T
+        slopes = (values[next_rows] - values) / steps[:, None]
+        rhs = 6 * (slopes - slopes[prev_rows])
+        second_derivs = np.linalg.solve(system, rhs).T.reshape(thickness.shape)
+
+        # stored as (phi * theta, layers) so each lookup gathers one
+        # contiguous row of layer values
+        num_layers = len(self.layer_names)
+        self._periodic_grid = {
+            "phi": phi,
+            "theta": theta,
+            "theta_steps": steps,
+            "thickness": thickness.reshape(num_layers, -1).T.copy(),
+            "second_derivs": second_derivs.reshape(num_layers, -1).T.copy(),
+        }
+        return self._periodic_grid
+
+    def _wrap_angles(self, phi, theta):
         """
-        Builds openmc model using the build definition
+        Map angles into the span of phi_list and [theta_min, theta_min + 360)
+        using the toroidal periodicity and, if enabled, stellarator symmetry.
         """
-        self.build_surfaces()
-        self.build_regions()
-        self.build_cells()
-        self.get_bounded_geometry()
-        self.build_tallies()
+        grid = self._get_periodic_grid()
+        phi_min = grid["phi"][0]
+        phi_span = grid["phi"][-1] - phi_min
 
-    def get_openmc_model(self):
+        # angles already inside the grid are left alone so the values at both
+        # ends of phi_list are kept
+        outside = (phi < phi_min) | (phi > phi_min + phi_span)
+        if phi_span > 0 and np.any(outside):
+            if self.stellarator_symmetric:
+                offset = np.mod(phi - phi_min, 2 * phi_span)
+                mirrored = outside & (offset > phi_span)
+                offset = np.where(mirrored, 2 * phi_span - offset, offset)
+                theta = np.where(mirrored, -theta, theta)
+            else:
+                offset = np.mod(phi - phi_min, phi_span)
+            phi = np.where(outside, phi_min + offset, phi)
+        elif phi_span == 0:
+            phi = np.full_like(phi, phi_min)
+
+        theta_min = grid["theta"][0]
+        theta = theta_min + np.mod(theta - theta_min, 360)
+
+        return phi, theta
+
+    def interpolate(self, phi, theta, method="linear"):
         """
-        Return toroidal model built using the build definition, contains
-        geometry and material information
+        Interpolate the thickness of every layer at arbitrary angles. Theta is
+        treated as periodic over 360 degrees, and phi as periodic over the
+        field period described by phi_list.
+
+        Arguments:
+            phi (float or array of float): toroidal angles
+            theta (float or array of float): poloidal angles, broadcast
+                against phi
+            method (str): "linear" for bilinear interpolation, or "spline"
+                for a periodic cubic spline in theta combined with linear
+                interpolation in phi
 
         Returns:
-            model (openmc model): Model containing materials and geometry
-                from the build dict.
-            cells (dict): dict mapping layer names to openmc cell instances in
-                the model object returned by this function.
+            thicknesses (array): shape of the broadcast angles plus a
+                trailing layer axis
         """
-        self.build_openmc_model()
-        model = openmc.Model(
-            geometry=self.geometry, materials=self.materials, tallies=self.tallies
+        if method not in ("linear", "spline"):
+            raise ValueError(
+                f"unknown interpolation method {method}, use 'linear' or "
+                "'spline'"
+            )
+
+        phi, theta = np.broadcast_arrays(
+            np.asarray(phi, dtype=float), np.asarray(theta, dtype=float)
         )
-        return model, self.cell_dict
+        shape = phi.shape
+        phi, theta = self._wrap_angles(phi.ravel(), theta.ravel())
 
+        grid = self._get_periodic_grid()
+        phi_grid = grid["phi"]
+        theta_grid = grid["theta"]
+        num_theta = len(theta_grid)
 
-def parse_args():
-    """Parser for running as a script"""
-    parser = argparse.ArgumentParser(prog="plot_radial_build")
+        # bracketing rows in phi
+        if len(phi_grid) > 1:
+            phi_lo = np.clip(
+                np.searchsorted(phi_grid, phi, side="right") - 1,
+                0,
+                len(phi_grid) - 2,
+            )
+            phi_weight = (phi - phi_grid[phi_lo]) / (
+                phi_grid[phi_lo + 1] - phi_grid[phi_lo]
+            )
+            phi_hi = phi_lo + 1
+        else:
+            phi_lo = phi_hi = np.zeros(phi.shape, dtype=int)
+            phi_weight = np.zeros(phi.shape)
 
-    parser.add_argument("filename", help="YAML file defining radial build")
+        # bracketing columns in theta, wrapping past the last column
+        theta_lo = np.clip(
+            np.searchsorted(theta_grid, theta, side="right") - 1,
+            0,
+            num_theta - 1,
+        )
+        theta_hi = (theta_lo + 1) % num_theta
+        steps = grid["theta_steps"][theta_lo]
+        theta_weight = (theta - theta_grid[theta_lo]) / steps
 
-    return parser.parse_args()
+        thickness = grid["thickness"]
+        second_derivs = grid["second_derivs"]
+        theta_weight = theta_weight[:, None]
+        spline_scale = (steps**2 / 6)[:, None]
 
+        def interpolate_row(row):
+            lo = row * num_theta + theta_lo
+            hi = row * num_theta + theta_hi
+            values = thickness[lo]
+            values += theta_weight * (thickness[hi] - values)
+            if method == "spline":
+                lo_weight = 1 - theta_weight
+                values += spline_scale * (
+                    (lo_weight**3 - lo_weight) * second_derivs[lo]
+                    + (theta_weight**3 - theta_weight) * second_derivs[hi]
+                )
+            return values
 
-def read_yaml(filename):
-    """Reads yaml file to extract title and build variables"""
-    with open(filename) as file:
-        data = yaml.safe_load(file)
+        values = interpolate_row(phi_lo)
+        values += phi_weight[:, None] * (interpolate_row(phi_hi) - values)
 
-    return data
+        return values.reshape(shape + (-1,))
 
+    def _build_from_thicknesses(self, thicknesses):
+        """Radial build dict, as used by RadialBuildPlot, for one slice"""
+        build = {}
+        for layer_name, thickness, tag, color in zip(
+            self.layer_names, thicknesses, self.h5m_tags, self.colors
+        ):
+            build[layer_name] = {
+                "thickness": float(thickness),
+                "description": tag,
+            }
+            if color is not None:
+                build[layer_name]["color"] = color
+        return build
 
-def main():
-    args = parse_args()
-    data = read_yaml(args.filename)
+    def build(self, phi, theta, method="nearest"):
+        """
+        Get the radial build dict of a single (phi, theta) slice.
+
+        Arguments:
+            phi (float): toroidal angle
+            theta (float): poloidal angle
+            method (str): "nearest" to use the nearest grid angles, or an
+                interpolation method accepted by interpolate
+
+        Returns:
+            build (dict): radial build dict, suitable for RadialBuildPlot
+        """
+        if method != "nearest":
+            return self._build_from_thicknesses(
+                self.interpolate(phi, theta, method)
+            )
+
+        phi_index, theta_index = self.angle_indices(phi, theta)
+        thicknesses = [
+            matrix[phi_index, theta_index]
+            for matrix in self.thickness_matrices
+        ]
+        return self._build_from_thicknesses(thicknesses)
+
+    def builds(self, phi, theta, method="nearest"):
+        """
+        Get the radial build dicts for a batch of (phi, theta) pairs.
+
+        Arguments:
+            phi (iter of float): toroidal angles
+            theta (iter of float): poloidal angles, broadcast against phi
+            method (str): "nearest" to use the nearest grid angles, or an
+                interpolation method accepted by interpolate
+
+        Returns:
+            builds (list of dict): radial build dict of each slice
+        """
+        if method == "nearest":
+            thicknesses = self.thicknesses(phi, theta)
+        else:
+            thicknesses = self.interpolate(phi, theta, method)
+        thicknesses = thicknesses.reshape(-1, len(self.layer_names))
+        return [self._build_from_thicknesses(row) for row in thicknesses]
+
+    def _range_mask(self, grid, angle_range, grid_name):
+        """
+        Select the grid angles inside angle_range, inclusive and within atol.
+        A range whose start is larger than its end wraps around, e.g.
+        (300, 60) selects angles from 300 up and from 60 down.
+        """
+        if angle_range is None:
+            return np.ones(len(grid), dtype=bool)
+        start, end = angle_range
+        atol = 0 if self.atol is None else self.atol
+        if start <= end:
+            mask = (grid >= start - atol) & (grid <= end + atol)
+        else:
+            mask = (grid >= start - atol) | (grid <= end + atol)
+        if not np.any(mask):
+            raise ValueError(
+                f"no value in {grid_name} is within {tuple(angle_range)}"
+            )
+        return mask
+
+    def thickness_envelope(self, phi_range=None, theta_range=None):
+        """
+        Reduce the thickness of every layer over the angle grid, or part of
+        it, to its minimum, mean and maximum.
+
+        Arguments:
+            phi_range (iter of float): Optional, (start, end) of the toroidal
+                angles to include. If None, all of phi_list is used.
+            theta_range (iter of float): Optional, (start, end) of the
+                poloidal angles to include. If None, all of theta_list is
+                used.
+
+        Returns:
+            minimum (array): smallest thickness of each layer
+            mean (array): mean thickness of each layer over the grid points
+            maximum (array): largest thickness of each layer
+        """
+        phi_mask = self._range_mask(self.phi_list, phi_range, "phi_list")
+        theta_mask = self._range_mask(
+            self.theta_list, theta_range, "theta_list"
+        )
+        thickness = self.thickness[:, phi_mask][:, :, theta_mask]
+        return (
+            thickness.min(axis=(1, 2)),
+            thickness.mean(axis=(1, 2)),
+            thickness.max(axis=(1, 2)),
+        )
+
+
+class ThicknessAtlasPlot(object):
+    """
+    Draws the thickness of every layer of a ParaStell build over the whole
+    (phi, theta) grid as one heatmap panel per layer, plus a panel for the
+    total build depth, in a single figure. Each panel is a single image, so
+    reviewing a build costs one draw per layer instead of one figure per
+    slice.
+
+    Parameters
+        parastell_build (dict or ParastellBuild): ParaStell build, see
+            ParastellBuild
+    Optional attributes:
+        title (string): title for plot and filename to save to
+        unit (str): Unit of thickness values
+        size (iter of float): figure size, inches. (width, height). If None,
+            it is chosen from the number of panels.
+        dpi (float): resolution of the png, dots per inch
+        cmap (str): matplotlib colormap for the heatmaps
+        ncols (int): number of panel columns. If None, panels are laid out in
+            a roughly square grid.
+        shared_scale (bool): if True, all layer panels use the same color
+            scale, so thicknesses can be compared between layers. The total
+            depth panel always has its own scale.
+        stats (PipelineStats): record of stage timings and counters to fill
+            in while plotting
+    """
+
+    def __init__(self, parastell_build, **kwargs):
+        if not isinstance(parastell_build, ParastellBuild):
+            parastell_build = ParastellBuild(parastell_build)
+        self.parastell_build = parastell_build
+        self.title = "thickness_atlas"
+        self.unit = "cm"
+        self.size = None
+        self.dpi = 200
+        self.cmap = "viridis"
+        self.ncols = None
+        self.shared_scale = False
+        self.stats = PipelineStats(enabled=False)
+        for name in kwargs.keys() & (
+            "title",
+            "unit",
+            "size",
+            "dpi",
+            "cmap",
+            "ncols",
+            "shared_scale",
+            "stats",
+        ):
+            self.__setattr__(name, kwargs[name])
+
+    def atlas_data(self):
+        """
+        Thickness of every layer and the total depth on the sorted angle
+        grid.
+
+        Returns:
+            phi (1D array): sorted toroidal angles
+            theta (1D array): sorted poloidal angles
+            thickness (3D array): layer thicknesses indexed
+                [layer, phi, theta]
+            total (2D array): total depth of the build indexed [phi, theta]
+        """
+        build = self.parastell_build
+        phi = build.phi_list[build._phi_order]
+        theta = build.theta_list[build._theta_order]
+        thickness = build.thickness[
+            :, build._phi_order[:, None], build._theta_order[None, :]
+        ]
+        return phi, theta, thickness, thickness.sum(axis=0)
+
+    @staticmethod
+    def _draw_heatmap(ax, phi, theta, matrix, **kwargs):
+        """
+        Draw a [phi, theta] matrix with phi along x and theta along y, as an
+        image when both grids are evenly spaced and as a mesh otherwise.
+        """
+        evenly_spaced = all(
+            len(grid) < 3 or np.allclose(np.diff(grid), grid[1] - grid[0])
+            for grid in (phi, theta)
+        )
+        if evenly_spaced:
+            half_phi = (phi[1] - phi[0]) / 2 if len(phi) > 1 else 0.5
+            half_theta = (theta[1] - theta[0]) / 2 if len(theta) > 1 else 0.5
+            return ax.imshow(
+                matrix.T,
+                origin="lower",
+                aspect="auto",
+                interpolation="nearest",
+                extent=(
+                    phi[0] - half_phi,
+                    phi[-1] + half_phi,
+                    theta[0] - half_theta,
+                    theta[-1] + half_theta,
+                ),
+                **kwargs,
+            )
+        return ax.pcolormesh(phi, theta, matrix.T, shading="nearest", **kwargs)
+
+    def plot_atlas(self, figure=None):
+        """
+        Creates the atlas, one panel per layer followed by the total depth.
+
+        Arguments:
+            figure (matplotlib Figure): Optional, existing figure to clear and
+                draw into instead of creating a new one.
+        """
+        with self.stats.stage("atlas_data"):
+            phi, theta, thickness, total = self.atlas_data()
+
+        names = self.parastell_build.layer_names + ["total depth"]
+        matrices = list(thickness) + [total]
+        ncols = self.ncols
+        if ncols is None:
+            ncols = int(np.ceil(np.sqrt(len(matrices))))
+        nrows = int(np.ceil(len(matrices) / ncols))
+        size = self.size
+        if size is None:
+            size = (4 * ncols, 3 * nrows)
+
+        if figure is None:
+            fig = plt.figure(figsize=size)
+        else:
+            fig = figure
+            fig.clear()
+            fig.set_size_inches(size)
+
+        scale = {}
+        if self.shared_scale and len(thickness):
+            scale = {"vmin": thickness.min(), "vmax": thickness.max()}
+
+        axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+        with self.stats.stage("atlas_panels"):
+            for index, (ax, name, matrix) in enumerate(
+                zip(axes, names, matrices)
+            ):
+                panel_scale = scale if index < len(thickness) else {}
+                image = self._draw_heatmap(
+                    ax, phi, theta, matrix, cmap=self.cmap, **panel_scale
+                )
+                fig.colorbar(image, ax=ax, label=self.unit)
+                ax.set_title(name)
+                if index + ncols >= len(matrices):
+                    ax.set_xlabel("phi (deg)")
+                if index % ncols == 0:
+                    ax.set_ylabel("theta (deg)")
+            for ax in axes[len(matrices):]:
+                ax.set_axis_off()
+        self.stats.count("layers", len(thickness))
+
+        fig.suptitle(self.title, fontsize=20)
+        fig.tight_layout()
+
+        self.figure = fig
+
+    def to_png(self, filename=None):
+        """
+        Write the plot to a png file.
+
+        Arguments:
+            filename (str): Optional, file name to write the plot to. If None,
+                file name will be the same as the plot title
+        """
+        if filename is None:
+            filename = self.title.replace(" ", "")
+
+        with self.stats.stage("png_encode"):
+            self.figure.savefig(f"{filename}.png", dpi=self.dpi)
+        if self.stats.enabled:
+            self.stats.count("bytes_written", os.path.getsize(f"{filename}.png"))
+
+
+def parastell_angle_grid(phi_values, theta_values):
+    """
+    Get every (phi, theta) combination of the given angles.
+
+    Arguments:
+        phi_values (iterable of float): toroidal angles
+        theta_values (iterable of float): poloidal angles
+
+    Returns:
+        angles (list of tuple): (phi, theta) pairs, phi varying slowest
+    """
+    return [(phi, theta) for phi in phi_values for theta in theta_values]
+
+
+def _slice_filename(output_dir, prefix, phi, theta):
+    """File name, without extension, for the plot of one ParaStell slice"""
+    return os.path.join(output_dir, f"{prefix}_phi_{phi:g}_theta_{theta:g}")
+
+
+# per process state of the ParaStell batch renderer, set up once per worker
+_parastell_worker = {}
+
+
+def _init_parastell_worker(parastell_build, plot_kwargs, output_dir, profile):
+    """
+    Set up a ParaStell render worker, storing the build and creating the
+    figure that is reused for every slice the worker renders.
+    """
+    _parastell_worker["profile"] = profile
+    _parastell_worker["build"] = parastell_build
+    _parastell_worker["plot_kwargs"] = plot_kwargs
+    _parastell_worker["output_dir"] = output_dir
+    _parastell_worker["figure"] = plt.figure()
+
+
+def _render_parastell_slice(angle):
+    """
+    Render one (phi, theta) slice in a ParaStell render worker, returning the
+    png file name and, if profiling, the slice's stats as a dict
+    """
+    phi, theta = angle
+    plot_kwargs = dict(_parastell_worker["plot_kwargs"])
+    prefix = plot_kwargs.pop("title", "parastell_build")
+    stats = PipelineStats(enabled=_parastell_worker["profile"])
+    with stats.stage("extract_slice"):
+        build = _parastell_worker["build"].build(phi, theta)
+    rbp = RadialBuildPlot(
+        build,
+        title=f"{prefix} phi={phi:g} theta={theta:g}",
+        stats=stats,
+        **plot_kwargs,
+    )
+    with stats.stage("plot_radial_build"):
+        rbp.plot_radial_build(figure=_parastell_worker["figure"])
+    filename = _slice_filename(
+        _parastell_worker["output_dir"], prefix.replace(" ", ""), phi, theta
+    )
+    rbp.to_png(filename)
+    return f"{filename}.png", stats.to_dict() if stats.enabled else None
+
+
+def render_parastell_build(
+    parastell_build_dict,
+    angles=None,
+    output_dir=".",
+    workers=None,
+    stats=None,
+    **kwargs,
+):
+    """
+    Render a radial build plot png for many (phi, theta) slices of a ParaStell
+    build, spread over a pool of worker processes. Layer colors are assigned
+    once so every slice uses the same colors, and each worker draws all of its
+    slices into a single reused figure.
+
+    Arguments:
+        parastell_build_dict (dict or ParastellBuild): ParaStell build with
+            "phi_list", "theta_list" and "radial_build" members
+        angles (iterable of tuple): Optional, (phi, theta) pairs to render. If
+            None, every combination of phi_list and theta_list is rendered.
+        output_dir (str): directory to write the png files to
+        workers (int): number of worker processes, defaults to the number of
+            CPUs. If 1, slices are rendered in the calling process.
+        stats (PipelineStats): Optional, record to add the stage timings and
+            counters of every slice to
+        **kwargs: passed to the RadialBuildPlot constructor. "title" is used
+            as the prefix of each plot title and file name.
+
+    Returns:
+        filenames (list of str): png files written, in the order of angles
+        slices_per_second (float): rendering throughput
+    """
+    if isinstance(parastell_build_dict, ParastellBuild):
+        parastell_build = parastell_build_dict
+    else:
+        parastell_build = ParastellBuild(parastell_build_dict)
+
+    if angles is None:
+        angles = parastell_angle_grid(
+            parastell_build.phi_list, parastell_build.theta_list
+        )
+    angles = [(float(phi), float(theta)) for phi, theta in angles]
+
+    # assign colors once from the first slice so all slices match, this also
+    # checks every angle is on the grid before any work is sent out
+    color_kwargs = {
+        name: kwargs.pop(name) for name in kwargs.keys() & {"seed", "palette_file"}
+    }
+    if angles:
+        parastell_build.angle_indices(*np.transpose(angles))
+        template = RadialBuildPlot(
+            parastell_build.build(*angles[0]), **color_kwargs
+        )
+        # render a shallow copy with the template's colors, leaving the
+        # colors of the caller's build as they are
+        colored_build = ParastellBuild.__new__(ParastellBuild)
+        colored_build.__dict__.update(parastell_build.__dict__)
+        colored_build._owns_shared_memory = False
+        colored_build.colors = list(template.colors)
+        parastell_build = colored_build
+
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(angles)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_parastell_worker(
+            parastell_build, kwargs, output_dir, stats is not None
+        )
+        try:
+            rendered = [_render_parastell_slice(angle) for angle in angles]
+        finally:
+            plt.close(_parastell_worker.pop("figure"))
+    else:
+        # publish the thicknesses once and let the workers attach to them,
+        # rather than pickling a copy of every matrix to each worker
+        shared_build = None
+        if parastell_build._backing is None:
+            shared_build = parastell_build.to_shared_memory()
+        initargs = (
+            parastell_build if shared_build is None else shared_build,
+            kwargs,
+            output_dir,
+            stats is not None,
+        )
+        chunksize = max(1, len(angles) // (workers * 4))
+        try:
+            with multiprocessing.Pool(
+                workers,
+                initializer=_init_parastell_worker,
+                initargs=initargs,
+            ) as pool:
+                rendered = list(
+                    pool.imap(
+                        _render_parastell_slice, angles, chunksize=chunksize
+                    )
+                )
+        finally:
+            if shared_build is not None:
+                shared_build.release()
+    elapsed = time.perf_counter() - start
+
+    filenames = [filename for filename, _ in rendered]
+    if stats is not None:
+        for _, slice_stats in rendered:
+            stats.merge(slice_stats)
+        stats.count("slices", len(filenames))
+
+    slices_per_second = len(filenames) / elapsed if elapsed > 0 else 0.0
+
+    return filenames, slices_per_second
+
+
+class MaterialLibrary(object):
+    """
+    OpenMC material library indexed by material name, for constant time
+    lookups. A library can be shared by any number of ToroidalModel
+    instances, and libraries read from xml are cached by path and
+    modification time so each file is only parsed once.
+
+    Parameters
+        materials (OpenMC Materials object or iterable of OpenMC Material):
+            materials in the library
+        duplicates (str): what to do with materials that share a name.
+            "first" looks up the first of them, "last" the last, and "error"
+            raises a ValueError. Materials without a name are not indexed.
+    """
+
+    # (absolute path, modification time, size, duplicates): MaterialLibrary
+    _xml_cache = {}
+
+    def __init__(self, materials, duplicates="first"):
+        if duplicates not in ("first", "last", "error"):
+            raise ValueError(
+                f"unknown duplicates policy {duplicates}, use 'first', "
+                "'last' or 'error'"
+            )
+        if not isinstance(materials, openmc.Materials):
+            materials = openmc.Materials(materials)
+        self.materials = materials
+        self.duplicates = duplicates
+
+        index = {}
+        duplicate_names = set()
+        for mat in materials:
+            if not mat.name:
+                continue
+            if mat.name in index:
+                duplicate_names.add(mat.name)
+                if duplicates != "last":
+                    continue
+            index[mat.name] = mat
+        if duplicates == "error" and duplicate_names:
+            raise ValueError(
+                f"materials {sorted(duplicate_names)} appear more than once "
+                "in the library"
+            )
+        self.index = index
+        self.duplicate_names = duplicate_names
+
+    @classmethod
+    def from_xml(cls, path, duplicates="first"):
+        """
+        Read a library from an OpenMC materials xml file, reusing the library
+        from an earlier call if the file has not changed since.
+
+        Arguments:
+            path (str): path to the materials xml file
+            duplicates (str): duplicate name policy, see MaterialLibrary
+
+        Returns:
+            library (MaterialLibrary): library of the materials in the file
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, duplicates)
+        library = cls._xml_cache.get(key)
+        if library is None:
+            # forget older versions of the same file
+            for stale_key in [k for k in cls._xml_cache if k[0] == path]:
+                del cls._xml_cache[stale_key]
+            library = cls(openmc.Materials.from_xml(path), duplicates)
+            cls._xml_cache[key] = library
+        return library
+
+    @classmethod
+    def clear_cache(cls):
+        """Forget every library read by from_xml"""
+        cls._xml_cache.clear()
+
+    def __contains__(self, material_name):
+        return material_name in self.index
+
+    def __iter__(self):
+        return iter(self.materials)
+
+    def __len__(self):
+        return len(self.materials)
+
+    def get(self, material_name):
+        """
+        Get the material with a given name.
+
+        Arguments:
+            material_name (str): name of the material
+
+        Returns:
+            mat (OpenMC material object): material with a matching name
+        """
+        try:
+            return self.index[material_name]
+        except KeyError:
+            # if this returns none, openmc will just assign vacuum to any
+            # cell using this material
+            raise ValueError(
+                f"no material name {material_name} was found in the library"
+            ) from None
+
+
+def torus_shell_volumes(
+    inboard, outboard, major_rad, minor_rad_z, minor_rad_xy
+):
+    """
+    Exact volume of each layer of a toroidal build, the difference of the
+    volumes of the ZTorus surfaces on either side of it. By Pappus's theorem
+    a ZTorus with parameters (a, b, c) encloses 2 pi a * pi b c, as long as
+    c < a so the torus has a hole. The leading axes of the thicknesses and
+    radii broadcast against each other, so many builds are evaluated in one
+    call.
+
+    Arguments:
+        inboard (array): inboard thickness of each layer, shape
+            (..., layers)
+        outboard (array): outboard thickness of each layer, shape
+            (..., layers)
+        major_rad (float or array): major radius of the plasma torus, shape
+            (...)
+        minor_rad_z (float or array): minor radius of the plasma parallel
+            to the z axis, shape (...)
+        minor_rad_xy (float or array): minor radius of the plasma
+            perpendicular to the z axis, shape (...)
+
+    Returns:
+        volumes (array): volume of each layer, shape (..., layers)
+    """
+    inboard = np.asarray(inboard, dtype=float)
+    outboard = np.asarray(outboard, dtype=float)
+    major_rad = np.asarray(major_rad, dtype=float)[..., None]
+    minor_rad_z = np.asarray(minor_rad_z, dtype=float)[..., None]
+    minor_rad_xy = np.asarray(minor_rad_xy, dtype=float)[..., None]
+
+    def enclosed_volume(inboard_radii, outboard_radii):
+        shift = (outboard_radii - inboard_radii) / 2
+        growth = (outboard_radii + inboard_radii) / 2
+        return (
+            2
+            * np.pi**2
+            * (major_rad + shift)
+            * (minor_rad_z + growth)
+            * (minor_rad_xy + growth)
+        )
+
+    inboard_radii = np.cumsum(inboard, axis=-1)
+    outboard_radii = np.cumsum(outboard, axis=-1)
+    return enclosed_volume(inboard_radii, outboard_radii) - enclosed_volume(
+        inboard_radii - inboard, outboard_radii - outboard
+    )
+
+
+class ToroidalModel(object):
+    """
+    An object that uses a radial build definition generate OpenMC models
+    with toroidal geometry.
+
+    Parameters
+        build (dict or RadialBuild): {"layer name": {
+                            "thickness": (float),
+                            "composition": {
+                                "material name": fraction (float)
+                                },
+                            "material_name": (str) name of material in
+                                associated OpenMC material library. To have a
+                                layer with vacuum/void do not include the
+                                'material_name' key.
+                            "color": (str): Optional matplotlib color string
+                                          or hex code to specify the layer's color.
+                    }
+                }
+            The dict corresponding to each "layer_name" key may be empty,
+            or have any combination of entries.
+        major_rad (float): major radius of the torus
+        minor_rad_z (float): minor radius of the plasma region parallel to the
+            z axis
+        minor_rad_xy (float): minor radius of the plasma region perpendicular
+            to the z axis
+        materials (str, OpenMC Materials object or MaterialLibrary): path to
+            the OpenMC materials xml file for this model, the corresponding
+            Materials OpenMC object, or a MaterialLibrary that may be shared
+            between models
+        bounding_shape (str): shape of the vacuum boundary around the build,
+            "sphere", "box" or "cylinder". The box and cylinder fit the torus
+            more tightly, wasting fewer histories in the void region.
+        bounding_margin (float): gap between the outermost layer and the
+            vacuum boundary
+        tally_mode (str): "per_layer" for one tally per (layer, score) pair,
+            or "grouped" for one tally per set of scores, shared by all the
+            layers requesting it. See build_tallies.
+        stats (PipelineStats): Optional, record of stage timings and counters
+            to fill in while building and exporting the model
+    """
+
+    # layer indices given by classify_points to points in the plasma and
+    # outside the build
+    PLASMA = -1
+    OUTSIDE = -2
+
+    def __init__(
+        self,
+        build,
+        major_rad,
+        minor_rad_z,
+        minor_rad_xy,
+        materials,
+        bounding_shape="sphere",
+        bounding_margin=1.0,
+        tally_mode="per_layer",
+        stats=None,
+    ):
+        if isinstance(build, RadialBuild):
+            # set_layer_thickness and set_layer_material change the build, so
+            # keep a copy that does not share the caller's material names
+            self.radial_build = build.copy()
+            self.radial_build.material_names = list(build.material_names)
+            self._build = None
+        else:
+            self._build = expand_ib_ob(build)
+            self.radial_build = RadialBuild.from_dict(build)
+        self.major_rad = major_rad
+        self.minor_rad_z = minor_rad_z
+        self.minor_rad_xy = minor_rad_xy
+        self.bounding_shape = bounding_shape
+        self.bounding_margin = bounding_margin
+        self.tally_mode = tally_mode
+        self.stats = PipelineStats(enabled=False) if stats is None else stats
+        self.model = None
+        self.dirty = set()
+        if isinstance(materials, MaterialLibrary):
+            self.material_library = materials
+        elif isinstance(materials, str):
+            self.material_library = MaterialLibrary.from_xml(materials)
+        else:
+            self.material_library = MaterialLibrary(materials)
+        self.input_materials = self.material_library.materials
+
+        self.assign_materials()
+
+    @property
+    def build(self):
+        """
+        Radial build dict of the model. Created from radial_build on first
+        access if the model was made from a RadialBuild. Changes made to the
+        dict are read into radial_build when the OpenMC model is built.
+        """
+        if self._build is None:
+            self._build = expand_ib_ob(self.radial_build.to_dict())
+            for layer, material in zip(
+                self._build.values(), self.layer_materials
+            ):
+                layer["material"] = material
+        return self._build
+
+    @build.setter
+    def build(self, build):
+        self._build = expand_ib_ob(build)
+        self.radial_build = RadialBuild.from_dict(build)
+        self.assign_materials()
+
+    def read_build(self):
+        """
+        Read the build dict into radial_build, so changes made to the dict
+        directly are used by the next OpenMC model built. Layers with a
+        "material" keep it, others get the material named by
+        "material_name". Does nothing if the build dict was never used.
+        """
+        if self._build is None:
+            return
+        self.radial_build = RadialBuild.from_dict(self._build)
+        for layer, material_name in zip(
+            self._build.values(), self.radial_build.material_names
+        ):
+            if "material" not in layer:
+                layer["material"] = (
+                    None
+                    if material_name is None
+                    else self.get_material_by_name(material_name)
+                )
+        self.layer_materials = [
+            layer["material"] for layer in self._build.values()
+        ]
+
+    def assign_materials(self):
+        """
+        Assign OpenMC material objects to each layer in the build
+        """
+        self.layer_materials = [
+            None if name is None else self.get_material_by_name(name)
+            for name in self.radial_build.material_names
+        ]
+        if self._build is not None:
+            for layer_data, material in zip(
+                self._build.values(), self.layer_materials
+            ):
+                layer_data["material"] = material
+
+    def get_material_by_name(self, material_name):
+        """
+        Look up a material by name in the material library. Openmc allows
+        duplicate names, and names are not required, be advised. Which of
+        several materials sharing a name is returned is set by the library's
+        duplicates policy.
+
+        Arguments:
+            material_name (string): name of material to be returned
+
+        Returns:
+            mat (OpenMC material object): material object with matching name
+        """
+        return self.material_library.get(material_name)
+
+    def layer_densities(self):
+        """
+        Returns:
+            densities (array): mass density of each layer's material in
+                g/cm3, zero for void layers
+        """
+        return np.array(
+            [
+                0.0 if material is None else material.get_mass_density()
+                for material in self.layer_materials
+            ]
+        )
+
+    def layer_volumes(self):
+        """
+        Exact volume of each layer, computed from the same ZTorus parameters
+        as build_surfaces without building any geometry. Zero thickness
+        layers have zero volume.
+
+        Returns:
+            volumes (array): volume of each layer, cm3 for lengths in cm
+        """
+        return self.radial_build.shell_volumes(
+            self.major_rad, self.minor_rad_z, self.minor_rad_xy
+        )
+
+    def layer_masses(self):
+        """
+        Returns:
+            masses (array): mass of each layer in g, for lengths in cm, from
+                its volume and its material's density
+        """
+        return self.layer_volumes() * self.layer_densities()
+
+    def classify_points(self, points, chunk_size=2**20, return_names=False):
+        """
+        Find the layer holding each of many points, computed directly from
+        the ZTorus parameters used by build_surfaces instead of calling
+        Geometry.find point by point. A point belongs to the innermost torus
+        it is inside of, matching the regions of build_regions.
+
+        Arguments:
+            points (array): (N, 3) array of x, y, z coordinates
+            chunk_size (int): number of points classified at a time, bounding
+                the memory used for intermediate arrays. If None, all points
+                are classified at once.
+            return_names (bool): if True, return the name of each point's
+                cell instead of its layer index
+
+        Returns:
+            layers (array): index into radial_build.names of the layer
+                holding each point, ToroidalModel.PLASMA for points in the
+                plasma and ToroidalModel.OUTSIDE for points outside the
+                outermost layer. If return_names, an array of cell names,
+                "plasma_cell" or "vac_cell" instead.
+        """
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(
+                f"points must have shape (N, 3), not {points.shape}"
+            )
+
+        major_rads, minor_rads_z, minor_rads_xy = (
+            self.radial_build.torus_parameters(
+                self.major_rad, self.minor_rad_z, self.minor_rad_xy
+            )
+        )
+        nonzero = np.flatnonzero(self.radial_build.nonzero)
+        # surfaces from the outside in, so inner tori overwrite outer ones
+        surfaces = [
+            (i, major_rads[i], minor_rads_z[i] ** -2, minor_rads_xy[i] ** -2)
+            for i in nonzero[::-1]
+        ]
+        surfaces.append(
+            (
+                self.PLASMA,
+                self.major_rad,
+                self.minor_rad_z**-2,
+                self.minor_rad_xy**-2,
+            )
+        )
+
+        layers = np.empty(len(points), dtype=int)
+        if chunk_size is None:
+            chunk_size = max(1, len(points))
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start : start + chunk_size]
+            rho = np.hypot(chunk[:, 0], chunk[:, 1])
+            z_sq = chunk[:, 2] ** 2
+            chunk_layers = layers[start : start + chunk_size]
+            chunk_layers.fill(self.OUTSIDE)
+            for index, major_rad, inv_z_sq, inv_xy_sq in surfaces:
+                level = rho - major_rad
+                np.square(level, out=level)
+                level *= inv_xy_sq
+                level += z_sq * inv_z_sq
+                chunk_layers[level < 1] = index
+
+        if not return_names:
+            return layers
+        # OUTSIDE and PLASMA index the last two names
+        names = np.array(
+            list(self.radial_build.names) + ["vac_cell", "plasma_cell"],
+            dtype=object,
+        )
+        return names[layers]
+
+    def sample_points(self, count, rng=None):
+        """
+        Draw random points spread evenly over the plasma, each nonzero layer
+        and a shell of bounding_margin around the build, so thin layers get
+        as many points as thick ones. Each point is placed on a torus
+        between the inner and outer surface of its region, at a random
+        fraction of the way out and random toroidal and poloidal angles.
+
+        Arguments:
+            count (int): number of points
+            rng (numpy Generator): Optional, random number generator
+
+        Returns:
+            points (array): (count, 3) array of x, y, z coordinates
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        major_rads, minor_rads_z, minor_rads_xy = (
+            self.radial_build.torus_parameters(
+                self.major_rad, self.minor_rad_z, self.minor_rad_xy
+            )
+        )
+        nonzero = np.flatnonzero(self.radial_build.nonzero)
+        surfaces = [
+            (self.major_rad, 0.0, 0.0),
+            (self.major_rad, self.minor_rad_z, self.minor_rad_xy),
+        ]
+        surfaces.extend(
+            (major_rads[i], minor_rads_z[i], minor_rads_xy[i]) for i in nonzero
+        )
+        if self.bounding_margin > 0:
+            a, b, c = surfaces[-1]
+            margin = self.bounding_margin
+            surfaces.append((a, b + margin, c + margin))
+        surfaces = np.array(surfaces, dtype=float)
+
+        # stay clear of the surfaces themselves, where OpenMC and
+        # classify_points could round differently
+        region = rng.integers(len(surfaces) - 1, size=count)
+        fraction = rng.uniform(1e-6, 1 - 1e-6, size=(count, 1))
+        inner = surfaces[region]
+        a, b, c = (inner + fraction * (surfaces[region + 1] - inner)).T
+        phi = rng.uniform(0, 2 * np.pi, size=count)
+        theta = rng.uniform(0, 2 * np.pi, size=count)
+        rho = a + c * np.cos(theta)
+        return np.column_stack(
+            (rho * np.cos(phi), rho * np.sin(phi), b * np.sin(theta))
+        )
+
+    def check_geometry(
+        self, samples=20000, batch_size=1000, workers=None, seed=None
+    ):
+        """
+        Check the OpenMC geometry for gaps, overlaps and cells in the wrong
+        place, such as from layer surfaces that cross or from layers skipped
+        by mistake, before running it. Points from sample_points are tested
+        against the region of every cell with OpenMC's Python geometry and
+        compared to classify_points. No cross sections are needed. Batches
+        of points are spread over a pool of worker processes.
+
+        Arguments:
+            samples (int): number of points to test
+            batch_size (int): number of points in each batch sent to a
+                worker
+            workers (int): number of worker processes, defaults to the number
+                of CPUs. If 1, points are tested in the calling process.
+            seed (int): Optional, seed for the points, so checks are
+                reproducible
+
+        Returns:
+            report (dict): "samples" tested, number of "errors", "ok" if
+                there were none, and "cells", for each expected cell name,
+                its "samples", "gaps" (points in no cell), "overlaps" (in
+                several cells), "wrong" (in one other cell) and "error_rate"
+        """
+        if self.model is None:
+            self.get_openmc_model()
+
+        batches = [
+            (number, min(batch_size, samples - start))
+            for number, start in enumerate(range(0, samples, batch_size))
+        ]
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(batches)))
+
+        initargs = (self, seed)
+        if workers == 1:
+            _init_geometry_check_worker(*initargs)
+            results = [_check_geometry_batch(batch) for batch in batches]
+        else:
+            with multiprocessing.Pool(
+                workers,
+                initializer=_init_geometry_check_worker,
+                initargs=initargs,
+            ) as pool:
+                results = pool.map(_check_geometry_batch, batches, chunksize=1)
+
+        cells = {}
+        for counts in results:
+            for name, batch_counts in counts.items():
+                total = cells.setdefault(
+                    name, {"samples": 0, "gaps": 0, "overlaps": 0, "wrong": 0}
+                )
+                for key, value in batch_counts.items():
+                    total[key] += value
+        # report cells from the plasma outward
+        order = ["plasma_cell"] + list(self.radial_build.names) + ["vac_cell"]
+        cells = {name: cells[name] for name in order if name in cells}
+        errors = 0
+        for total in cells.values():
+            cell_errors = total["gaps"] + total["overlaps"] + total["wrong"]
+            total["error_rate"] = cell_errors / total["samples"]
+            errors += cell_errors
+
+        return {
+            "samples": samples,
+            "errors": errors,
+            "ok": errors == 0,
+            "cells": cells,
+        }
+
+    def build_surfaces(self):
+        """
+        Build the surfaces representing the radial build using OpenMC CSG.
+        Layers with zero inboard and outboard thickness get no surface.
+        """
+        # build surfaces
+        surfaces = {}
+
+        surfaces["plasma_surface"] = openmc.ZTorus(
+            a=self.major_rad, b=self.minor_rad_z, c=self.minor_rad_xy
+        )
+
+        major_rads, minor_rads_z, minor_rads_xy = (
+            self.radial_build.torus_parameters(
+                self.major_rad, self.minor_rad_z, self.minor_rad_xy
+            )
+        )
+        nonzero = self.radial_build.nonzero
+        for i, surface in enumerate(self.radial_build.names):
+            if not nonzero[i]:
+                continue
+            surfaces[surface] = openmc.ZTorus(
+                a=float(major_rads[i]),
+                b=float(minor_rads_z[i]),
+                c=float(minor_rads_xy[i]),
+            )
+
+        self.surfaces = surfaces
+
+    def build_regions(self):
+        """
+        Build OpenMC regions from the surfaces defined by the build dict
+        """
+        # build regions
+        regions = {}
+
+        regions["plasma"] = -self.surfaces["plasma_surface"]
+
+        surf_list = list(self.surfaces.keys())
+
+        for inner_surf, outer_surf in zip(surf_list[0:-1], surf_list[1:]):
+            regions[outer_surf] = (
+                -self.surfaces[outer_surf] & +self.surfaces[inner_surf]
+            )
+
+        self.regions = regions
+        self.surf_list = surf_list
+
+    def build_cells(self):
+        """
+        Build OpenMC cells from the regions defined by the build, skipping the
+        same zero thickness layers as build_surfaces
+        """
+        # build cells
+        cell_dict = {}
+        materials = []
+
+        cell_dict["plasma_cell"] = openmc.Cell(
+            region=self.regions["plasma"], name="plasma_cell"
+        )
+
+        nonzero = self.radial_build.nonzero
+        for i, layer in enumerate(self.radial_build.names):
+            material = self.layer_materials[i]
+            if nonzero[i]:
+                cell_dict[layer] = openmc.Cell(
+                    region=self.regions[layer],
+                    name=layer,
+                    fill=material,
+                )
+            if material is not None and material not in materials:
+                materials.append(material)
+
+        self.cell_list = list(cell_dict.values())
+        self.cell_dict = cell_dict
+        self.materials = openmc.Materials(materials)
+
+    def get_outer_extent(self):
+        """
+        Closed form extent of the outermost ZTorus surface of the build
+
+        Returns:
+            radial (float): largest distance from the z axis
+            height (float): largest distance from the z = 0 plane
+            radius (float): largest distance from the origin
+        """
+        outer = self.surfaces[self.surf_list[-1]]
+        a, b, c = outer.a, outer.b, outer.c
+        radial = a + c
+        height = b
+
+        # squared distance from the origin along the surface's cross section
+        # is quadratic in the cosine of the poloidal angle, its maximum is at
+        # the outboard midplane unless the vertex of a taller than wide
+        # ellipse lies inside the cross section
+        radius_sq = radial**2
+        if b > c:
+            cos_vertex = a * c / (b**2 - c**2)
+            if cos_vertex < 1:
+                radius_sq = max(
+                    radius_sq,
+                    (a + c * cos_vertex) ** 2 + b**2 * (1 - cos_vertex**2),
+                )
+
+        return radial, height, radius_sq**0.5
+
+    def get_bounding_surface(self):
+        """
+        Build the vacuum boundary around the outermost layer, a sphere,
+        box or cylinder sized from the analytic extent of the build plus
+        bounding_margin.
+
+        Returns:
+            vac_surf (OpenMC surface or composite surface): vacuum boundary,
+                the bounded region is its negative half space
+        """
+        radial, height, radius = self.get_outer_extent()
+        margin = self.bounding_margin
+
+        if self.bounding_shape == "sphere":
+            return openmc.Sphere(r=radius + margin, boundary_type="vacuum")
+        if self.bounding_shape == "box":
+            half_width = radial + margin
+            half_height = height + margin
+            return openmc.model.RectangularParallelepiped(
+                -half_width,
+                half_width,
+                -half_width,
+                half_width,
+                -half_height,
+                half_height,
+                boundary_type="vacuum",
+            )
+        if self.bounding_shape == "cylinder":
+            half_height = height + margin
+            return openmc.model.RightCircularCylinder(
+                (0.0, 0.0, -half_height),
+                2 * half_height,
+                radial + margin,
+                axis="z",
+                boundary_type="vacuum",
+            )
+        raise ValueError(
+            f"unknown bounding_shape {self.bounding_shape}, use 'sphere', "
+            "'box' or 'cylinder'"
+        )
+
+    def get_bounded_geometry(self):
+        """
+        Get an OpenMC geometry instances containing all cells, plus a bounding
+        vacuum cell
+        """
+        vac_surf = self.get_bounding_surface()
+
+        vac_region = -vac_surf & +self.surfaces[self.surf_list[-1]]
+        vac_cell = openmc.Cell(region=vac_region, name="vac_cell")
+
+        self.cell_list.append(vac_cell)
+        self.cell_dict["vac_cell"] = vac_cell
+        self.vac_surf = vac_surf
+
+        self.geometry = openmc.Geometry(self.cell_list)
+
+    def build_tallies(self):
+        """
+        Build cell tallies for each score given in build dictionary, if given.
+
+        With tally_mode "per_layer" every (layer, score) pair gets its own
+        tally and CellFilter. With "grouped", layers with the same set of
+        scores, in any order, share one tally with a single multi-bin
+        CellFilter, use get_tally_bin to find the bin of a (layer, score)
+        pair.
+        """
+        if self.tally_mode not in ("per_layer", "grouped"):
+            raise ValueError(
+                f"unknown tally_mode {self.tally_mode}, use 'per_layer' or "
+                "'grouped'"
+            )
+
+        tally_list = []
+        tally_bins = {}
+        groups = {}
+        for layer, extras in zip(
+            self.radial_build.names, self.radial_build.extras
+        ):
+            if "scores" not in extras:
+                continue
+            if self.tally_mode == "grouped":
+                scores = tuple(sorted(set(extras["scores"])))
+                groups.setdefault(scores, []).append(layer)
+                continue
+            for score in extras["scores"]:
+                cell_filter = openmc.CellFilter(self.cell_dict[layer])
+                cell_tally = openmc.Tally(name=f"{layer} {score}")
+                cell_tally.filters = [cell_filter]
+                cell_tally.scores = [score]
+                tally_list.append(cell_tally)
+                tally_bins[(layer, score)] = (cell_tally, 0, 0)
+
+        for scores, layers in groups.items():
+            cell_filter = openmc.CellFilter(
+                [self.cell_dict[layer] for layer in layers]
+            )
+            cell_tally = openmc.Tally(name=" ".join(scores))
+            cell_tally.filters = [cell_filter]
+            cell_tally.scores = list(scores)
+            tally_list.append(cell_tally)
+            for cell_bin, layer in enumerate(layers):
+                for score_bin, score in enumerate(scores):
+                    tally_bins[(layer, score)] = (
+                        cell_tally,
+                        cell_bin,
+                        score_bin,
+                    )
+
+        self.tallies = openmc.Tallies(tally_list)
+        self.tally_bins = tally_bins
+
+    def get_tally_bin(self, layer, score):
+        """
+        Find where the result of a (layer, score) pair is stored.
+
+        Arguments:
+            layer (str): layer name
+            score (str): tally score
+
+        Returns:
+            tally (OpenMC Tally): tally holding the result
+            cell_bin (int): index of the layer's cell in the tally's
+                CellFilter
+            score_bin (int): index of the score in the tally's scores
+        """
+        try:
+            return self.tally_bins[(layer, score)]
+        except KeyError:
+            raise ValueError(
+                f"layer {layer} has no tally with score {score}"
+            ) from None
+
+    def build_openmc_model(self):
+        """
+        Builds openmc model using the build definition
+        """
+        stats = self.stats
+        self.read_build()
+        with stats.stage("build_surfaces"):
+            self.build_surfaces()
+        with stats.stage("build_regions"):
+            self.build_regions()
+        with stats.stage("build_cells"):
+            self.build_cells()
+        with stats.stage("get_bounded_geometry"):
+            self.get_bounded_geometry()
+        with stats.stage("build_tallies"):
+            self.build_tallies()
+        stats.count("layers", len(self.radial_build))
+        # layer surfaces plus the vacuum boundary
+        stats.count("surfaces", len(self.surfaces) + 1)
+        stats.count("cells", len(self.cell_list))
+        stats.count("tallies", len(self.tallies))
+        self.dirty = {"geometry", "materials", "tallies"}
+
+        # keep a model returned earlier pointing at the current objects
+        if self.model is not None:
+            self.model.geometry = self.geometry
+            self.model.materials = self.materials
+            self.model.tallies = self.tallies
+
+    def get_openmc_model(self):
+        """
+        Return toroidal model built using the build definition, contains
+        geometry and material information
+
+        Returns:
+            model (openmc model): Model containing materials and geometry
+                from the build dict.
+            cells (dict): dict mapping layer names to openmc cell instances in
+                the model object returned by this function.
+        """
+        self.build_openmc_model()
+        model = openmc.Model(
+            geometry=self.geometry, materials=self.materials, tallies=self.tallies
+        )
+        self.model = model
+        return model, self.cell_dict
+
+    def export_to_model_xml(self, path="model.xml"):
+        """
+        Build the model if needed and write it to a single model xml file,
+        recording the export time and file size in stats.
+
+        Arguments:
+            path (str): path of the model xml file
+
+        Returns:
+            path (str): path of the model xml file
+        """
+        if self.model is None:
+            self.get_openmc_model()
+        with self.stats.stage("export_to_model_xml"):
+            self.model.export_to_model_xml(path)
+        if self.stats.enabled:
+            self.stats.count("bytes_written", os.path.getsize(path))
+        self.dirty = set()
+        return path
+
+    def set_layer_thickness(self, name, inboard, outboard=None):
+        """
+        Change the thickness of one layer. If the OpenMC model has been built,
+        it is updated in place: the ZTorus surfaces of the layer and every
+        layer outside it, and the bounding surface, are moved, while all cells,
+        regions and tallies are kept. Only the geometry is marked dirty.
+
+        A layer changing to or from zero thickness adds or removes a cell, in
+        which case the whole model is rebuilt with new cells and tallies.
+
+        Arguments:
+            name (str): layer name
+            inboard (float): inboard thickness
+            outboard (float): Optional, outboard thickness. Same as inboard if
+                not given.
+        """
+        if outboard is None:
+            outboard = inboard
+        i = self.radial_build.index[name]
+        was_nonzero = bool(self.radial_build.nonzero[i])
+        self.radial_build.set_thickness(name, inboard, outboard)
+
+        if self._build is not None:
+            layer = self._build[name]
+            if inboard == outboard:
+                layer["thickness"] = inboard
+            else:
+                layer["thickness"] = [inboard, outboard]
+            layer["inboard"] = inboard
+            layer["outboard"] = outboard
+
+        if not hasattr(self, "surfaces"):
+            return
+        if bool(self.radial_build.nonzero[i]) != was_nonzero:
+            self.build_openmc_model()
+            return
+
+        major_rads, minor_rads_z, minor_rads_xy = (
+            self.radial_build.torus_parameters(
+                self.major_rad, self.minor_rad_z, self.minor_rad_xy
+            )
+        )
+        nonzero = self.radial_build.nonzero
+        for j in range(i, len(self.radial_build)):
+            if not nonzero[j]:
+                continue
+            surface = self.surfaces[self.radial_build.names[j]]
+            surface.a = float(major_rads[j])
+            surface.b = float(minor_rads_z[j])
+            surface.c = float(minor_rads_xy[j])
+
+        self.vac_surf = self.get_bounding_surface()
+        self.cell_dict["vac_cell"].region = (
+            -self.vac_surf & +self.surfaces[self.surf_list[-1]]
+        )
+        self.dirty.add("geometry")
+
+    def set_layer_material(self, name, material_name):
+        """
+        Change the material of one layer. If the OpenMC model has been built,
+        the fill of the layer's cell and the model materials are updated in
+        place, marking the geometry and materials dirty.
+
+        Arguments:
+            name (str): layer name
+            material_name (str): name of the material in the material library,
+                None for a void layer
+        """
+        i = self.radial_build.index[name]
+        material = (
+            None
+            if material_name is None
+            else self.get_material_by_name(material_name)
+        )
+        # replace the list, it may be shared with copies of the build
+        material_names = list(self.radial_build.material_names)
+        material_names[i] = material_name
+        self.radial_build.material_names = material_names
+        self.layer_materials[i] = material
+
+        if self._build is not None:
+            layer = self._build[name]
+            layer["material"] = material
+            if material_name is None:
+                layer.pop("material_name", None)
+            else:
+                layer["material_name"] = material_name
+
+        if not hasattr(self, "cell_dict"):
+            return
+        if name in self.cell_dict:
+            self.cell_dict[name].fill = material
+            self.dirty.add("geometry")
+
+        materials = []
+        for mat in self.layer_materials:
+            if mat is not None and mat not in materials:
+                materials.append(mat)
+        self.materials.clear()
+        for mat in materials:
+            self.materials.append(mat)
+        self.dirty.add("materials")
+
+    def export_dirty_xml(self, directory="."):
+        """
+        Write the geometry, materials and tallies xml files that changed since
+        the model was built or last exported, and mark them clean.
+
+        Arguments:
+            directory (str): directory to write geometry.xml, materials.xml
+                and tallies.xml to
+
+        Returns:
+            written (list of str): paths of the files written
+        """
+        sections = {
+            "geometry": self.geometry,
+            "materials": self.materials,
+            "tallies": self.tallies,
+        }
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        for section in sorted(self.dirty):
+            path = os.path.join(directory, f"{section}.xml")
+            with self.stats.stage(f"export_{section}_xml"):
+                sections[section].export_to_xml(path)
+            if self.stats.enabled:
+                self.stats.count("bytes_written", os.path.getsize(path))
+            written.append(path)
+        self.dirty = set()
+        return written
+
+
+# per process state of ToroidalModel.check_geometry, set up once per worker
+_geometry_check_worker = {}
+
+
+def _init_geometry_check_worker(toroidal_model, seed):
+    """
+    Set up a geometry check worker, collecting the name and region of every
+    cell once for all the batches the worker tests.
+    """
+    _geometry_check_worker["model"] = toroidal_model
+    _geometry_check_worker["seed"] = seed
+    _geometry_check_worker["cells"] = [
+        (cell.name, cell.region)
+        for cell in toroidal_model.geometry.get_all_cells().values()
+    ]
+
+
+def _check_geometry_batch(batch):
+    """
+    Test one batch of random points in a geometry check worker, returning
+    counts of points tested, gaps, overlaps and wrong cells per expected cell
+    name
+    """
+    number, count = batch
+    toroidal_model = _geometry_check_worker["model"]
+    rng = np.random.default_rng([_geometry_check_worker["seed"], number])
+    points = toroidal_model.sample_points(count, rng)
+    expected = toroidal_model.classify_points(points, return_names=True)
+
+    counts = {}
+    for point, name in zip(points, expected):
+        found = [
+            cell_name
+            for cell_name, region in _geometry_check_worker["cells"]
+            if point in region
+        ]
+        cell_counts = counts.setdefault(
+            name, {"samples": 0, "gaps": 0, "overlaps": 0, "wrong": 0}
+        )
+        cell_counts["samples"] += 1
+        if not found:
+            cell_counts["gaps"] += 1
+        elif len(found) > 1:
+            cell_counts["overlaps"] += 1
+        elif found[0] != name:
+            cell_counts["wrong"] += 1
+    return counts
+
+
+def sweep_variants(parameters=None, samples=None):
+    """
+    Get the parameter values of each variant in a sweep.
+
+    Parameters are "major_rad", "minor_rad_z", "minor_rad_xy", or
+    "<layer name>.<entry>" where entry is "thickness", "inboard" or
+    "outboard".
+
+    Arguments:
+        parameters (dict): Optional, parameter name: list of values. Every
+            combination of the values is a variant.
+        samples (list of dict): Optional, parameter name: value for each
+            variant. Added after the grid variants.
+
+    Returns:
+        variants (list of dict): parameter name: value for each variant
+    """
+    variants = []
+    if parameters:
+        names = list(parameters.keys())
+        for values in itertools.product(*parameters.values()):
+            variants.append(dict(zip(names, values)))
+    if samples:
+        variants.extend(dict(sample) for sample in samples)
+    return variants
+
+
+# names of the ToroidalModel arguments that can be swept
+_torus_parameters = ("major_rad", "minor_rad_z", "minor_rad_xy")
+
+
+def apply_sweep_parameters(radial_build, radii, variant):
+    """
+    Apply the parameter values of one sweep variant.
+
+    Arguments:
+        radial_build (RadialBuild): base build, not modified
+        radii (dict): base "major_rad", "minor_rad_z" and "minor_rad_xy"
+        variant (dict): parameter name: value, see sweep_variants
+
+    Returns:
+        radial_build (RadialBuild): copy of the build with the variant's
+            thicknesses
+        radii (dict): torus radii of the variant
+    """
+    radial_build = radial_build.copy()
+    radii = dict(radii)
+    for name, value in variant.items():
+        if name in _torus_parameters:
+            radii[name] = value
+            continue
+        layer, _, entry = name.rpartition(".")
+        if layer not in radial_build:
+            raise ValueError(f"sweep parameter {name} has no layer {layer}")
+        i = radial_build.index[layer]
+        if entry == "thickness":
+            if isinstance(value, (tuple, list)):
+                radial_build.set_thickness(layer, value[0], value[1])
+            else:
+                radial_build.set_thickness(layer, value)
+        elif entry == "inboard":
+            radial_build.set_thickness(layer, value, radial_build.outboard[i])
+        elif entry == "outboard":
+            radial_build.set_thickness(layer, radial_build.inboard[i], value)
+        else:
+            raise ValueError(
+                f"unknown sweep parameter {name}, layer entries are "
+                "'thickness', 'inboard' or 'outboard'"
+            )
+    return radial_build, radii
+
+
+def sweep_thicknesses(radial_build, radii, variants):
+    """
+    Layer thicknesses and torus radii of every variant of a sweep as arrays,
+    set one parameter at a time across all variants rather than by copying
+    the build for each variant.
+
+    Arguments:
+        radial_build (RadialBuild): base build
+        radii (dict): base "major_rad", "minor_rad_z" and "minor_rad_xy"
+        variants (list of dict): parameter name: value for each variant, see
+            sweep_variants
+
+    Returns:
+        inboard (array): inboard thicknesses, shape (variants, layers)
+        outboard (array): outboard thicknesses, shape (variants, layers)
+        radii (dict): "major_rad", "minor_rad_z" and "minor_rad_xy" of each
+            variant, arrays of shape (variants,)
+    """
+    count = len(variants)
+    inboard = np.tile(np.asarray(radial_build.inboard, dtype=float), (count, 1))
+    outboard = np.tile(
+        np.asarray(radial_build.outboard, dtype=float), (count, 1)
+    )
+    radii = {name: np.full(count, float(radii[name])) for name in radii}
+
+    names = dict.fromkeys(name for variant in variants for name in variant)
+    for name in names:
+        rows = np.array([name in variant for variant in variants])
+        values = [variant[name] for variant in variants if name in variant]
+        if name in _torus_parameters:
+            radii[name][rows] = values
+            continue
+        layer, _, entry = name.rpartition(".")
+        if layer not in radial_build:
+            raise ValueError(f"sweep parameter {name} has no layer {layer}")
+        i = radial_build.index[layer]
+        if entry == "thickness":
+            pairs = np.array(
+                [
+                    value if isinstance(value, (tuple, list)) else (value, value)
+                    for value in values
+                ],
+                dtype=float,
+            )
+            inboard[rows, i] = pairs[:, 0]
+            outboard[rows, i] = pairs[:, 1]
+        elif entry == "inboard":
+            inboard[rows, i] = values
+        elif entry == "outboard":
+            outboard[rows, i] = values
+        else:
+            raise ValueError(
+                f"unknown sweep parameter {name}, layer entries are "
+                "'thickness', 'inboard' or 'outboard'"
+            )
+    return inboard, outboard, radii
+
+
+def sweep_layer_volumes(
+    build,
+    major_rad,
+    minor_rad_z,
+    minor_rad_xy,
+    parameters=None,
+    samples=None,
+):
+    """
+    Exact volume of every layer of every variant of a sweep, in one
+    vectorized evaluation and without building any models, for screening
+    variants before run_toroidal_sweep. Multiply by
+    ToroidalModel.layer_densities of the base model for the layer masses.
+
+    Arguments:
+        build (dict or RadialBuild): base radial build, see ToroidalModel
+        major_rad (float): base major radius of the torus
+        minor_rad_z (float): base minor radius parallel to the z axis
+        minor_rad_xy (float): base minor radius perpendicular to the z axis
+        parameters (dict): Optional, grid of parameter values, see
+            sweep_variants
+        samples (list of dict): Optional, list of parameter values, see
+            sweep_variants
+
+    Returns:
+        variants (list of dict): parameter name: value for each variant
+        volumes (array): volume of each layer of each variant, shape
+            (variants, layers)
+    """
+    if isinstance(build, RadialBuild):
+        radial_build = build
+    else:
+        radial_build = RadialBuild.from_dict(build)
+    variants = sweep_variants(parameters, samples)
+    inboard, outboard, radii = sweep_thicknesses(
+        radial_build,
+        {
+            "major_rad": major_rad,
+            "minor_rad_z": minor_rad_z,
+            "minor_rad_xy": minor_rad_xy,
+        },
+        variants,
+    )
+    volumes = torus_shell_volumes(
+        inboard,
+        outboard,
+        radii["major_rad"],
+        radii["minor_rad_z"],
+        radii["minor_rad_xy"],
+    )
+    return variants, volumes
+
+
+# per process state of the ToroidalModel sweep, set up once per worker
+_sweep_worker = {}
+
+
+def _init_sweep_worker(
+    radial_build, radii, materials, output_dir, check_samples=0, profile=False
+):
+    """
+    Set up a sweep worker, reading the materials library once for every
+    variant the worker builds.
+    """
+    if isinstance(materials, str):
+        materials = MaterialLibrary.from_xml(materials)
+    _sweep_worker["profile"] = profile
+    _sweep_worker["radial_build"] = radial_build
+    _sweep_worker["radii"] = radii
+    _sweep_worker["materials"] = materials
+    _sweep_worker["output_dir"] = output_dir
+    _sweep_worker["check_samples"] = check_samples
+
+
+def _build_sweep_variant(numbered_variant):
+    """
+    Build and export the OpenMC model of one variant in a sweep worker,
+    returning its manifest entry and, if profiling, the variant's stats as a
+    dict
+    """
+    number, variant = numbered_variant
+    entry = {"variant": number, "parameters": variant}
+    stats = PipelineStats(enabled=_sweep_worker["profile"])
+    try:
+        radial_build, radii = apply_sweep_parameters(
+            _sweep_worker["radial_build"], _sweep_worker["radii"], variant
+        )
+        toroidal_model = ToroidalModel(
+            radial_build,
+            radii["major_rad"],
+            radii["minor_rad_z"],
+            radii["minor_rad_xy"],
+            _sweep_worker["materials"],
+            stats=stats,
+        )
+        check_samples = _sweep_worker["check_samples"]
+        if check_samples:
+            report = toroidal_model.check_geometry(
+                check_samples, workers=1, seed=number
+            )
+            entry["geometry_errors"] = report["errors"]
+            if not report["ok"]:
+                raise ValueError(
+                    f"geometry check found {report['errors']} errors in "
+                    f"{check_samples} points"
+                )
+        variant_dir = os.path.join(
+            _sweep_worker["output_dir"], f"variant_{number:05d}"
+        )
+        os.makedirs(variant_dir, exist_ok=True)
+        path = os.path.join(variant_dir, "model.xml")
+        entry["path"] = toroidal_model.export_to_model_xml(path)
+    except Exception as error:
+        entry["error"] = f"{type(error).__name__}: {error}"
+    return entry, stats.to_dict() if stats.enabled else None
+
+
+def run_toroidal_sweep(
+    build,
+    major_rad,
+    minor_rad_z,
+    minor_rad_xy,
+    materials,
+    parameters=None,
+    samples=None,
+    output_dir="sweep",
+    workers=None,
+    check_samples=0,
+    stats=None,
+):
+    """
+    Build and export an OpenMC model for every variant of a parametric sweep
+    over layer thicknesses and torus radii, spread over a pool of worker
+    processes. Each variant is written to its own directory,
+    output_dir/variant_NNNNN/model.xml, and a manifest mapping each variant's
+    parameters to its model is written to output_dir/manifest.json.
+
+    Arguments:
+        build (dict or RadialBuild): base radial build, see ToroidalModel
+        major_rad (float): base major radius of the torus
+        minor_rad_z (float): base minor radius parallel to the z axis
+        minor_rad_xy (float): base minor radius perpendicular to the z axis
+        materials (str, OpenMC Materials object or MaterialLibrary): path to
+            the OpenMC materials xml file, read once per worker, or the
+            materials
+        parameters (dict): Optional, grid of parameter values, see
+            sweep_variants
+        samples (list of dict): Optional, list of parameter values, see
+            sweep_variants
+        output_dir (str): directory to write the variants and manifest to
+        workers (int): number of worker processes, defaults to the number of
+            CPUs. If 1, variants are built in the calling process.
+        check_samples (int): if nonzero, check each variant's geometry at
+            this many points with ToroidalModel.check_geometry and do not
+            export variants that fail
+        stats (PipelineStats): Optional, record to add the stage timings and
+            counters of every variant's model to
+
+    Returns:
+        manifest (list of dict): for each variant, its number, "parameters",
+            and the "path" of its model xml, or the "error" that stopped it
+            from being built. Checked variants also have "geometry_errors".
+    """
+    if isinstance(build, RadialBuild):
+        radial_build = build
+    else:
+        radial_build = RadialBuild.from_dict(build)
+    radii = {
+        "major_rad": major_rad,
+        "minor_rad_z": minor_rad_z,
+        "minor_rad_xy": minor_rad_xy,
+    }
+    if not isinstance(materials, (str, MaterialLibrary)):
+        materials = MaterialLibrary(materials)
+    variants = list(enumerate(sweep_variants(parameters, samples)))
+
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(variants)))
+
+    initargs = (
+        radial_build,
+        radii,
+        materials,
+        output_dir,
+        check_samples,
+        stats is not None,
+    )
+    if workers == 1:
+        _init_sweep_worker(*initargs)
+        built = [_build_sweep_variant(variant) for variant in variants]
+    else:
+        with multiprocessing.Pool(
+            workers, initializer=_init_sweep_worker, initargs=initargs
+        ) as pool:
+            built = pool.map(_build_sweep_variant, variants, chunksize=1)
+
+    manifest = [entry for entry, _ in built]
+    if stats is not None:
+        for _, variant_stats in built:
+            stats.merge(variant_stats)
+        stats.count("variants", len(manifest))
+
+    with open(os.path.join(output_dir, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    return manifest
+
+
+class ModelCache(object):
+    """
+    On-disk cache of exported ToroidalModel xml files, keyed by a hash of
+    everything the exported model depends on: the build, the torus radii,
+    the definitions of the materials the build uses and the other
+    ToroidalModel options. A cache hit returns the path of the model xml
+    and the cell ids of its layers without building any OpenMC objects, or
+    even reading the materials with OpenMC. Materials given as OpenMC
+    objects rather than an xml path are keyed by their xml, ids included,
+    as the ids are written to the model.
+
+    Each entry is a directory named by its key, holding model.xml and
+    cells.json, which maps layer names, "plasma_cell" and "vac_cell" to cell
+    ids. Entries are written under a temporary name and renamed into place,
+    so processes can share a cache directory.
+
+    Parameters
+        directory (str): directory of the cache, created if needed
+        max_bytes (int): Optional, total size the cache is trimmed to after
+            each new entry, by removing the least recently used entries
+        max_age (float): Optional, seconds since its last use after which an
+            entry is removed
+    """
+
+    # (absolute path, modification time, size): {material name: xml}
+    _materials_xml_cache = {}
+
+    def __init__(self, directory, max_bytes=None, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def _materials_from_xml(cls, path):
+        """
+        Canonical xml of each named material in an OpenMC materials xml
+        file, the first of any sharing a name, as MaterialLibrary does by
+        default. Cached by path and modification time.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        materials = cls._materials_xml_cache.get(key)
+        if materials is None:
+            materials = {}
+            for element in ET.parse(path).getroot().iter("material"):
+                name = element.get("name")
+                if name and name not in materials:
+                    materials[name] = ET.canonicalize(
+                        ET.tostring(element), strip_text=True
+                    )
+            cls._materials_xml_cache[key] = materials
+        return materials
+
+    def key(
+        self, build, major_rad, minor_rad_z, minor_rad_xy, materials, **kwargs
+    ):
+        """
+        Hash of everything the exported model of a build depends on.
+
+        Arguments:
+            build, major_rad, minor_rad_z, minor_rad_xy, materials: see
+                ToroidalModel
+            **kwargs: other ToroidalModel arguments, such as bounding_shape
+
+        Returns:
+            key (str): hex digest
+        """
+        if isinstance(build, RadialBuild):
+            radial_build = build
+        else:
+            radial_build = RadialBuild.from_dict(build)
+        material_names = sorted(
+            {name for name in radial_build.material_names if name is not None}
+        )
+
+        if isinstance(materials, str):
+            definitions = self._materials_from_xml(materials)
+            missing = [
+                name for name in material_names if name not in definitions
+            ]
+            if missing:
+                raise ValueError(
+                    f"no material name {missing[0]} was found in the library"
+                )
+            definitions = {name: definitions[name] for name in material_names}
+        else:
+            if not isinstance(materials, MaterialLibrary):
+                materials = MaterialLibrary(materials)
+            definitions = {
+                name: ET.canonicalize(
+                    ET.tostring(materials.get(name).to_xml_element()),
+                    strip_text=True,
+                )
+                for name in material_names
+            }
+
+        options = {
+            name: parameter.default
+            for name, parameter in inspect.signature(
+                ToroidalModel
+            ).parameters.items()
+            if parameter.default is not inspect.Parameter.empty
+        }
+        options.update(kwargs)
+        options.pop("stats", None)
+
+        # only what ToroidalModel reads from each layer, so colors,
+        # compositions and descriptions do not change the key
+        normalized = {
+            "layers": [
+                [name, float(inboard), float(outboard), material_name, scores]
+                for name, inboard, outboard, material_name, scores in zip(
+                    radial_build.names,
+                    radial_build.inboard,
+                    radial_build.outboard,
+                    radial_build.material_names,
+                    [extras.get("scores") for extras in radial_build.extras],
+                )
+            ],
+            "radii": [major_rad, minor_rad_z, minor_rad_xy],
+            "materials": definitions,
+            "options": options,
+        }
+        text = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached model, marking it as used.
+
+        Arguments:
+            key (str): key of the model, see key
+
+        Returns:
+            path (str): path of the model xml, or None if it is not cached
+            cells (dict): layer name: cell id, or None if it is not cached
+        """
+        entry = os.path.join(self.directory, key)
+        cells_path = os.path.join(entry, "cells.json")
+        path = os.path.join(entry, "model.xml")
+        try:
+            with open(cells_path) as file:
+                cells = json.load(file)
+            os.utime(cells_path)
+        except (OSError, ValueError):
+            return None, None
+        if not os.path.isfile(path):
+            return None, None
+        return path, cells
+
+    def put(self, key, toroidal_model):
+        """
+        Export a model into the cache, then evict old entries.
+
+        Arguments:
+            key (str): key of the model, see key
+            toroidal_model (ToroidalModel): model to export
+
+        Returns:
+            path (str): path of the cached model xml
+            cells (dict): layer name: cell id
+        """
+        entry = os.path.join(self.directory, key)
+        temp_entry = f"{entry}.{os.getpid()}.tmp"
+        os.makedirs(temp_entry, exist_ok=True)
+        toroidal_model.export_to_model_xml(
+            os.path.join(temp_entry, "model.xml")
+        )
+        cells = {
+            name: cell.id for name, cell in toroidal_model.cell_dict.items()
+        }
+        with open(os.path.join(temp_entry, "cells.json"), "w") as file:
+            json.dump(cells, file, indent=2)
+        for attempt in range(2):
+            try:
+                os.replace(temp_entry, entry)
+                break
+            except OSError:
+                # another process cached the same model first. Its cell ids
+                # can differ from this model's, so return its entry whole.
+                path, cached_cells = self.get(key)
+                if path is not None:
+                    shutil.rmtree(temp_entry, ignore_errors=True)
+                    self.evict(keep=key)
+                    return path, cached_cells
+                if attempt == 1:
+                    shutil.rmtree(temp_entry, ignore_errors=True)
+                    raise
+                # a partial or corrupt entry is in the way, remove it
+                shutil.rmtree(entry, ignore_errors=True)
+
+        self.evict(keep=key)
+        return os.path.join(entry, "model.xml"), cells
+
+    def export(
+        self, build, major_rad, minor_rad_z, minor_rad_xy, materials, **kwargs
+    ):
+        """
+        Get the model xml of a build from the cache, building and exporting
+        the model only if it is not cached.
+
+        Arguments:
+            build, major_rad, minor_rad_z, minor_rad_xy, materials: see
+                ToroidalModel
+            **kwargs: other ToroidalModel arguments, such as bounding_shape
+
+        Returns:
+            path (str): path of the cached model xml
+            cells (dict): layer name: cell id
+        """
+        key = self.key(
+            build, major_rad, minor_rad_z, minor_rad_xy, materials, **kwargs
+        )
+        path, cells = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path, cells
+        self.misses += 1
+        toroidal_model = ToroidalModel(
+            build, major_rad, minor_rad_z, minor_rad_xy, materials, **kwargs
+        )
+        return self.put(key, toroidal_model)
+
+    def entries(self):
+        """
+        Returns:
+            entries (list of tuple): (key, size in bytes, time of last use)
+                of each cached model, least recently used first
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if key.endswith(".tmp") or not os.path.isdir(entry):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(entry, "cells.json"))
+                size = sum(
+                    os.path.getsize(os.path.join(entry, name))
+                    for name in os.listdir(entry)
+                )
+            except OSError:
+                continue
+            entries.append((key, size, last_used))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Remove entries older than max_age, then the least recently used
+        entries until the cache is no larger than max_bytes.
+
+        Arguments:
+            keep (str): Optional, key of an entry never to remove
+
+        Returns:
+            removed (list of str): keys of the removed entries
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        removed = []
+        # entries are least recently used first
+        for key, size, last_used in entries:
+            if key == keep:
+                continue
+            too_old = (
+                self.max_age is not None and now - last_used > self.max_age
+            )
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if too_old or too_big:
+                removed.append(key)
+                total -= size
+        for key in removed:
+            entry = os.path.join(self.directory, key)
+            shutil.rmtree(entry, ignore_errors=True)
+        return removed
+
+
+# top level entries of a radial build plot yml that affect the png
+_plot_options = (
+    "title",
+    "colors",
+    "max_characters",
+    "max_thickness",
+    "size",
+    "unit",
+    "dpi",
+    "render_mode",
+    "seed",
+)
+
+# name of the file recording what each png was rendered from
+PLOT_CACHE_FILE = ".radial_build_cache.json"
+
+
+def expand_filenames(patterns):
+    """
+    Expand glob patterns into file names, keeping patterns with no matches so
+    they are reported as missing.
+
+    Arguments:
+        patterns (iter of str): file names or glob patterns
+
+    Returns:
+        filenames (list of str): matching files, without duplicates
+    """
+    filenames = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for filename in matches:
+            if filename not in filenames:
+                filenames.append(filename)
+    return filenames
+
+
+def plot_cache_key(data):
+    """
+    Hash of everything in a radial build plot definition that affects the
+    rendered png: the build, with layer order kept, and the plot options.
+
+    Arguments:
+        data (dict): radial build plot definition, as read from yml
+
+    Returns:
+        key (str): hex digest
+    """
+    if isinstance(data.get("build"), RadialBuild):
+        build = data["build"].to_dict()
+    else:
+        build = data.get("build", {})
+    normalized = {
+        "layers": [[name, layer] for name, layer in build.items()],
+        "options": {
+            name: data[name] for name in _plot_options if name in data
+        },
+    }
+    text = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _plot_png_path(data, output_dir):
+    """Path of the png written for a radial build plot definition"""
+    title = data.get("title", "radial_build")
+    return os.path.join(output_dir, title.replace(" ", "") + ".png")
+
+
+def _plot_documents(filenames):
+    """
+    Lazily read the radial build plot definitions in many yml files. The
+    first document of a file is named by the file name and later ones by
+    "<file name>#<index>".
+
+    Yields:
+        name (str): name of the document
+        data (dict): plot definition, or None if it could not be read
+        error (str): error message, or None
+    """
+    for filename in filenames:
+        index = 0
+        try:
+            for data in read_yaml_stream(filename):
+                yield _document_name(filename, index), data, None
+                index += 1
+        except Exception as exception:
+            yield (
+                _document_name(filename, index),
+                None,
+                f"{type(exception).__name__}: {exception}",
+            )
+
+
+def _document_name(filename, index):
+    """Name of the index-th document of a yml file"""
+    return filename if index == 0 else f"{filename}#{index}"
+
+
+def _assign_palette_colors(data):
+    """
+    Color every layer of a radial build plot definition that uses a palette
+    file, adding new layer names to the file. render_plot_files does this in
+    the calling process, one plot at a time, so workers never read and write
+    the palette file at the same time.
+
+    Arguments:
+        data (dict): radial build plot definition
+
+    Returns:
+        data (dict): the definition with a "color" for every layer and
+            without "palette_file", or data itself if it has no palette file
+    """
+    if data.get("palette_file") is None:
+        return data
+    plot = RadialBuildPlot(**data)
+    data = dict(data, build=plot.build)
+    del data["palette_file"]
+    return data
+
+
+def _render_plot_file(task):
+    """
+    Render one radial build plot definition, returning the input file name,
+    png path and error message or None, plus the stats dict when profiling
+    """
+    filename, data, output_dir, profile = task
+    stats = PipelineStats(enabled=profile)
+    png_path = _plot_png_path(data, output_dir)
+    try:
+        rbp = RadialBuildPlot(**data, stats=stats)
+        with stats.stage("plot_radial_build"):
+            rbp.plot_radial_build()
+        rbp.to_png(png_path[: -len(".png")])
+        plt.close(rbp.figure)
+        error = None
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    return filename, png_path, error, stats.to_dict() if profile else None
+
+
+def render_plot_files(
+    filenames,
+    output_dir=".",
+    workers=None,
+    force=False,
+    stats=None,
+    options=None,
+):
+    """
+    Render the radial build plot of many yml files in parallel, skipping any
+    file whose png is already up to date. A cache file in output_dir records
+    the hash of the build and plot options each png was rendered from.
+
+    Arguments:
+        filenames (iter of str): radial build plot yml files. A file may
+            hold many plot definitions as separate yaml documents, which are
+            read one at a time. Each plot needs its own title, a plot whose
+            png is the same as that of an earlier one fails.
+        output_dir (str): directory to write the png files and cache to
+        workers (int): number of worker processes, defaults to the number of
+            CPUs. If 1, files are rendered in the calling process.
+        force (bool): render every file, even if its png is up to date
+        stats (PipelineStats): Optional, record to add the stage timings and
+            counters of every plot to
+        options (dict): Optional, plot options such as "seed" or
+            "palette_file" applied to every file, overriding its own
+
+    Returns:
+        summary (dict): "rendered" and "skipped" lists of file names, and
+            "failed", a list of (file name, error message). Documents after
+            the first in a file are named "<file name>#<index>".
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, PLOT_CACHE_FILE)
+    try:
+        with open(cache_path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+
+    summary = {"rendered": [], "skipped": [], "failed": []}
+    keys = {}
+    # name of the plot writing each png in this run
+    png_sources = {}
+
+    def pending_tasks():
+        for name, data, error in _plot_documents(filenames):
+            if error is None:
+                try:
+                    if options:
+                        data.update(options)
+                    data = _assign_palette_colors(data)
+                    key = plot_cache_key(data)
+                    png_path = _plot_png_path(data, output_dir)
+                except Exception as exception:
+                    error = f"{type(exception).__name__}: {exception}"
+            if error is None and png_path in png_sources:
+                error = (
+                    f"ValueError: {png_path} is already written by "
+                    f"{png_sources[png_path]}"
+                )
+            if error is not None:
+                summary["failed"].append((name, error))
+                continue
+            png_sources[png_path] = name
+            entry = cache.get(os.path.abspath(name))
+            if (
+                not force
+                and entry is not None
+                and entry["key"] == key
+                and entry["png"] == png_path
+                and os.path.exists(png_path)
+            ):
+                summary["skipped"].append(name)
+                continue
+            keys[name] = key
+            yield (name, data, output_dir, stats is not None)
+
+    def record(results):
+        for name, png_path, error, plot_stats in results:
+            if error is not None:
+                summary["failed"].append((name, error))
+                cache.pop(os.path.abspath(name), None)
+                continue
+            summary["rendered"].append(name)
+            # the png no longer holds the plot of any other file
+            for other in [
+                other
+                for other, entry in cache.items()
+                if entry["png"] == png_path
+            ]:
+                del cache[other]
+            cache[os.path.abspath(name)] = {
+                "key": keys[name],
+                "png": png_path,
+            }
+            if stats is not None:
+                stats.merge(plot_stats)
+
+    # files are read as the workers need them, only start the pool once
+    # there is something to render
+    tasks = pending_tasks()
+    first_task = next(tasks, None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if first_task is not None:
+        tasks = itertools.chain([first_task], tasks)
+        if workers == 1:
+            record(map(_render_plot_file, tasks))
+        else:
+            with multiprocessing.Pool(workers) as pool:
+                record(pool.imap(_render_plot_file, tasks, chunksize=1))
+
+    with open(cache_path, "w") as file:
+        json.dump(cache, file, indent=2)
+
+    return summary
+
+
+def parse_args():
+    """Parser for running as a script"""
+    parser = argparse.ArgumentParser(prog="plot_radial_build")
+
+    parser.add_argument(
+        "filenames",
+        nargs="+",
+        help="YAML files or glob patterns defining radial builds",
+    )
+    parser.add_argument(
+        "--parastell",
+        action="store_true",
+        help="treat files as ParaStell builds and plot one png per "
+        "(phi, theta) slice",
+    )
+    parser.add_argument(
+        "--phi",
+        type=float,
+        nargs="+",
+        help="ParaStell phi values to plot, defaults to all of phi_list",
+    )
+    parser.add_argument(
+        "--theta",
+        type=float,
+        nargs="+",
+        help="ParaStell theta values to plot, defaults to all of theta_list",
+    )
+    parser.add_argument(
+        "--atlas",
+        action="store_true",
+        help="with --parastell, plot every layer's thickness over all "
+        "(phi, theta) in one png instead of one png per slice",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="treat files as ToroidalModel sweep definitions and export "
+        "one OpenMC model per variant",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="directory to write plots or sweep variants to",
+    )
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="draw each side of the plot as one PatchCollection, quicker for "
+        "builds with many layers",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="seed for choosing layer colors, for reproducible plots",
+    )
+    parser.add_argument(
+        "--palette",
+        default=None,
+        help="yml file mapping layer names to colors, reused and extended "
+        "across plots",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="render every plot, even if its png is up to date",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each plotting or model building stage, "
+        "and counters",
+    )
+
+    return parser.parse_args()
+
+
+def read_yaml(filename):
+    """Reads yaml file to extract title and build variables"""
+    with open(filename) as file:
+        data = yaml.load(file, Loader=YamlLoader)
+
+    return data
+
+
+def read_yaml_stream(filename):
+    """
+    Lazily read the documents of a yaml file holding many builds separated by
+    "---", one at a time. Empty documents are skipped.
+
+    Arguments:
+        filename (str): path of the yml file
+
+    Yields:
+        data (dict): contents of each document
+    """
+    with open(filename) as file:
+        for data in yaml.load_all(file, Loader=YamlLoader):
+            if data is not None:
+                yield data
+
+
+def write_yaml_stream(documents, filename):
+    """
+    Write many builds to one yaml file, one document each, in the format
+    read by read_yaml_stream. Documents are written as they are produced, so
+    a generator is never held in memory at once.
+
+    Arguments:
+        documents (iter of dict): documents to write
+        filename (str): path of the yml file to write
+    """
+    with open(filename, "w") as file:
+        yaml.dump_all(
+            documents,
+            file,
+            Dumper=YamlDumper,
+            default_flow_style=False,
+            sort_keys=False,
+        )
+
+
+def _plot_options_from_args(args):
+    """Plot options given on the command line"""
+    options = {}
+    if args.fast:
+        options["render_mode"] = "fast"
+    if args.seed is not None:
+        options["seed"] = args.seed
+    if args.palette is not None:
+        options["palette_file"] = args.palette
+    return options
+
+
+def plot_parastell_slices(args, data, stats=None):
+    """Plot the ParaStell slices requested on the command line"""
+    plot_kwargs = {
+        name: data[name]
+        for name in data.keys()
+        & {"title", "colors", "max_characters", "max_thickness", "size", "unit"}
+    }
+    plot_kwargs.update(_plot_options_from_args(args))
+    phi_values = data["phi_list"] if args.phi is None else args.phi
+    theta_values = data["theta_list"] if args.theta is None else args.theta
+
+    output_dir = "." if args.output_dir is None else args.output_dir
+
+    filenames, slices_per_second = render_parastell_build(
+        data,
+        parastell_angle_grid(phi_values, theta_values),
+        output_dir=output_dir,
+        workers=args.workers,
+        stats=stats,
+        **plot_kwargs,
+    )
+    print(
+        f"Rendered {len(filenames)} slices to {output_dir} "
+        f"({slices_per_second:.1f} slices/s)"
+    )
+
+
+def plot_parastell_atlas(args, data, stats=None):
+    """Plot the thickness atlas of a ParaStell build"""
+    plot_kwargs = {
+        name: data[name] for name in data.keys() & {"title", "unit", "size"}
+    }
+    if stats is not None:
+        plot_kwargs["stats"] = stats
+    output_dir = "." if args.output_dir is None else args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    atlas = ThicknessAtlasPlot(data, **plot_kwargs)
+    atlas.plot_atlas()
+    filename = os.path.join(output_dir, atlas.title.replace(" ", ""))
+    atlas.to_png(filename)
+    plt.close(atlas.figure)
+    print(f"Wrote {filename}.png")
+
+
+def run_sweep_file(args, data, stats=None):
+    """
+    Run the ToroidalModel sweep defined in a yml file with members "build"
+    (or "build_file", the path of a radial build yml), "major_rad",
+    "minor_rad_z", "minor_rad_xy", "materials" (path to the materials xml),
+    and "parameters" and/or "samples", see sweep_variants, and optionally
+    "check_samples", see run_toroidal_sweep
+    """
+    if "build_file" in data:
+        build = RadialBuild.from_yaml(data["build_file"])
+    else:
+        build = data["build"]
+    output_dir = data.get("output_dir", "sweep")
+    if args.output_dir is not None:
+        output_dir = args.output_dir
+
+    manifest = run_toroidal_sweep(
+        build,
+        data["major_rad"],
+        data["minor_rad_z"],
+        data["minor_rad_xy"],
+        data["materials"],
+        parameters=data.get("parameters"),
+        samples=data.get("samples"),
+        output_dir=output_dir,
+        workers=args.workers,
+        check_samples=data.get("check_samples", 0),
+        stats=stats,
+    )
+    failed = [entry for entry in manifest if "error" in entry]
+    print(
+        f"Exported {len(manifest) - len(failed)} of {len(manifest)} variants "
+        f"to {output_dir}"
+    )
+    for entry in failed:
+        print(f"variant {entry['variant']} failed: {entry['error']}")
+
+
+def main():
+    args = parse_args()
+    filenames = expand_filenames(args.filenames)
+    stats = PipelineStats() if args.profile else None
+
+    if args.parastell:
+        plot = plot_parastell_atlas if args.atlas else plot_parastell_slices
+        for filename in filenames:
+            for data in read_yaml_stream(filename):
+                plot(args, data, stats)
+    elif args.sweep:
+        for filename in filenames:
+            for data in read_yaml_stream(filename):
+                run_sweep_file(args, data, stats)
+    else:
+        output_dir = "." if args.output_dir is None else args.output_dir
+        summary = render_plot_files(
+            filenames,
+            output_dir=output_dir,
+            workers=args.workers,
+            force=args.force,
+            stats=stats,
+            options=_plot_options_from_args(args),
+        )
+        print(
+            f"Rendered {len(summary['rendered'])}, skipped "
+            f"{len(summary['skipped'])} up to date, failed "
+            f"{len(summary['failed'])}"
+        )
+        for filename, error in summary["failed"]:
+            print(f"{filename} failed: {error}")
+
+    if stats is not None:
+        print(stats.report())
 
-    rbp = RadialBuildPlot(**data)
-    rbp.plot_radial_build()
-    rbp.to_png()
+    if not (args.parastell or args.sweep) and summary["failed"]:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":